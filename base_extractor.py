@@ -21,8 +21,20 @@ as a template to start your own projects.
 
 
 from abc import ABC, abstractmethod
+import collections
+import concurrent.futures
+import contextlib
+import gzip
+import itertools
+import json
 import logging
+import multiprocessing
+import multiprocessing.util
+import os
 from pathlib import Path
+import queue
+import random
+import threading
 import time
 import uuid
 from filelock import FileLock
@@ -35,9 +47,21 @@ from tableauhyperapi import (
     Telemetry,
     Inserter,
     CreateMode,
+    HyperException,
+    TableName,
+    TableDefinition,
+    SqlType,
+    TypeTag,
+    escape_name,
     escape_string_literal,
 )
 
+try:
+    import pyarrow
+except ImportError:
+    # Optional: only needed to insert Arrow record batches (see arrow_batch_rows)
+    pyarrow = None
+
 logger = logging.getLogger("hyper_samples.extractor.base")
 
 TELEMETRY = Telemetry.SEND_USAGE_DATA_TO_TABLEAU
@@ -53,7 +77,69 @@ TEMP_DIR = "/tmp"
 
 MAX_ROWS_PER_FILE = 100000
 """
-    MAX_ROWS_PER_FILE (int): Not yet implemented: Split output into smaller files for large query results
+    MAX_ROWS_PER_FILE (int): Split output into smaller files for large query results
+        Set to None to disable the row limit
+"""
+
+MAX_BYTES_PER_FILE = 1024 * 1024 * 1024  # 1GB
+"""
+    MAX_BYTES_PER_FILE (int): Start a new Hyper file once the current file reaches this size
+        (or, when loading from CSV, once this many bytes of CSV input have been loaded -
+        for gzip compressed CSV this is the compressed size)
+        Set to None to disable the size limit
+    NOTE: The size on disk lags behind the rows inserted because Hyper buffers writes until the
+        connection is closed, so files written from query results can exceed this limit by tens
+        of MB (e.g. 28MB files for an 8MB limit).  Treat it as a soft target.
+"""
+
+CSV_SPLIT_READ_BYTES = 16 * 1024 * 1024  # 16MB
+"""
+    CSV_SPLIT_READ_BYTES (int): Size of the blocks read when splitting a large CSV file at line ends
+"""
+
+CSV_OPTIONS = "format csv, NULL 'NULL', delimiter ','"
+"""
+    CSV_OPTIONS (string): Hyper COPY options used to parse database exports
+"""
+
+INSERTER_BATCH_ROWS = 10000
+"""
+    INSERTER_BATCH_ROWS (int): Number of rows sent to the Hyper Inserter between checks of
+        the row and byte limits above
+"""
+
+EXPORT_LOAD_SINGLE_FILE = False
+"""
+    EXPORT_LOAD_SINGLE_FILE (bool): export_load merges all exported shards into one Hyper file and
+        publishes it once, rather than publishing the first shard and appending the rest with one
+        PATCH job each.  The merged file holds the whole table, so local disk use grows with the
+        table size.
+"""
+
+MERGE_BATCH_FILES = 8
+"""
+    MERGE_BATCH_FILES (int): Number of exported files loaded by each multi-file COPY when merging
+        shards into a single Hyper file
+"""
+
+HYPER_WORKER_PROCESSES = 0
+"""
+    HYPER_WORKER_PROCESSES (int): Number of worker processes, each running its own Hyper process,
+        used to build Hyper files from exported files or query result rows in parallel.  Set to 0
+        to build them in this process.
+"""
+
+MERGE_PARTIAL_HYPER_FILES = True
+"""
+    MERGE_PARTIAL_HYPER_FILES (bool): Merge Hyper files built by worker processes into a single
+        Hyper file (by attaching each one and copying its rows once) where one file is expected
+"""
+
+PIPELINE_QUEUE_SIZE = 2
+"""
+    PIPELINE_QUEUE_SIZE (int): Number of finished items (e.g. Hyper files) each pipeline stage may
+        hold ready for the next stage.  Stages run in their own threads so that building, uploading
+        and applying Hyper files overlap.
 """
 
 SAMPLE_ROWS = 1000
@@ -61,9 +147,32 @@ SAMPLE_ROWS = 1000
     SAMPLE_ROWS (int): Default number of rows for LIMIT when using load_sample
 """
 
-ASYNC_JOB_POLL_INTERVAL = 5
+ASYNC_JOB_POLL_INTERVAL = 0.5
 """
-    ASYNC_JOB_POLL_INTERVAL (int): How many seconds to wait between polls for Asynchronous Job completion
+    ASYNC_JOB_POLL_INTERVAL (float): Seconds to wait before the first poll for Asynchronous Job completion,
+        and the shortest wait between polls
+"""
+
+ASYNC_JOB_POLL_MAX_INTERVAL = 60
+"""
+    ASYNC_JOB_POLL_MAX_INTERVAL (float): Maximum seconds to wait between polls for Asynchronous Job completion
+"""
+
+ASYNC_JOB_POLL_BACKOFF = 2
+"""
+    ASYNC_JOB_POLL_BACKOFF (float): Multiplier applied to the poll interval after each poll.  The interval
+    is also capped at half of the remaining time estimated from the job's reported progress.
+"""
+
+ASYNC_JOB_POLL_JITTER = 0.2
+"""
+    ASYNC_JOB_POLL_JITTER (float): Randomly vary each poll interval by up to +/- this fraction
+"""
+
+ASYNC_JOB_TIMEOUT = 6 * 60 * 60
+"""
+    ASYNC_JOB_TIMEOUT (int): Seconds to wait for an Asynchronous Job before raising TableauJobTimeoutError
+        Set to None to wait indefinitely
 """
 
 DATASOURCE_LOCK_TIMEOUT = 60
@@ -79,6 +188,37 @@ DATASOURCE_LOCKFILE_PREFIX = "/var/lock/tableau_extractor"
     DATASOURCE_LOCK_TIMEOUT (string): Defines the location of lockfiles
 """
 
+EXTRACT_STATE_PREFIX = "/var/lib/tableau_extractor/state"
+"""
+    EXTRACT_STATE_PREFIX (string): Defines the location of the files that record extract progress
+    for each datasource (e.g. the last partition loaded by a backfill) so an interrupted run can resume
+"""
+
+WATERMARK_STATE_KEY = "watermark:{}:{}"
+"""
+    WATERMARK_STATE_KEY (string): Extract state key recording the high-water mark applied by
+    incremental_append for each source table and watermark column
+"""
+
+LOOKUP_CACHE_TTL = 300
+"""
+    LOOKUP_CACHE_TTL (int): Seconds to cache datasource name to id lookups
+"""
+
+LOOKUP_PAGE_SIZE = 1000
+"""
+    LOOKUP_PAGE_SIZE (int): Page size used when listing projects and datasources
+"""
+
+DEFAULT_CHANGESET_TABLE_NAMES = {
+    "INSERT": "new_rows",
+    "UPDATE": "updated_rows",
+    "DELETE": "deleted_rowids",
+}
+"""
+    DEFAULT_CHANGESET_TABLE_NAMES (dict): Default changeset table name for each action in apply_changeset
+"""
+
 DEFAULT_SITE_ID = ""
 """
     DEFAULT_SITE_ID (string): Default site ID
@@ -114,6 +254,12 @@ class TableauJobError(Exception):
     pass
 
 
+class TableauJobTimeoutError(TableauJobError):
+    """Exception: Timed out waiting for Tableau Job"""
+
+    pass
+
+
 class TableauResourceNotFoundError(Exception):
     """Exception: Tableau Resource not found"""
 
@@ -132,6 +278,342 @@ def tempfile_name(prefix="", suffix=""):
     )
 
 
+SQL_TYPE_NAMES = {
+    "BIG_INT": "BIGINT",
+    "SMALL_INT": "SMALLINT",
+    "FLOAT": "REAL",
+    "DOUBLE": "DOUBLE PRECISION",
+    "BYTES": "BYTEA",
+    "TIMESTAMP_TZ": "TIMESTAMPTZ",
+}
+"""
+    SQL_TYPE_NAMES (dict): SQL spelling of Hyper SqlTypes whose str() is not valid SQL
+"""
+
+
+def sql_type_name(sql_type):
+    """
+    Returns the SQL type name for a tableauhyperapi.SqlType, e.g. for use in DESCRIPTOR()
+    """
+    return SQL_TYPE_NAMES.get(str(sql_type), str(sql_type))
+
+
+def csv_compression(path_to_csv):
+    """
+    Returns the Hyper compression option for a CSV file ("gzip" for *.gz), or None
+    """
+    return "gzip" if str(path_to_csv).endswith(".gz") else None
+
+
+def split_csv_file(path_to_csv, max_bytes_per_chunk, read_bytes=CSV_SPLIT_READ_BYTES):
+    """
+    Splits a CSV file into uncompressed chunk files of about max_bytes_per_chunk each,
+    cutting only at line ends outside quoted fields and repeating the header row at the
+    top of every chunk.
+    Yields the path of each chunk, which is removed when the next chunk is requested
+
+    path_to_csv (string): CSV file with a header row (may be gzip compressed)
+    max_bytes_per_chunk (int): Start a new chunk at the first line end after this many bytes
+    read_bytes (int): Size of the blocks read from path_to_csv (default=CSV_SPLIT_READ_BYTES)
+    """
+    open_csv = gzip.open if csv_compression(path_to_csv) == "gzip" else open
+    with open_csv(path_to_csv, "rb") as csv_file:
+        header = csv_file.readline()
+        block = csv_file.read(read_bytes)
+        while block:
+            path_to_chunk = Path(tempfile_name(prefix="chunk_", suffix=".csv"))
+            try:
+                with open(path_to_chunk, "wb") as chunk_file:
+                    chunk_file.write(header)
+                    chunk_bytes = 0
+                    in_quotes = False
+                    while block:
+                        cut = None
+                        if chunk_bytes + len(block) >= max_bytes_per_chunk:
+                            # Track quote parity up to each line end ("" escapes toggle twice)
+                            position = max(max_bytes_per_chunk - chunk_bytes, 0)
+                            quoted = in_quotes ^ (block.count(b'"', 0, position) % 2 == 1)
+                            while cut is None:
+                                line_end = block.find(b"\n", position)
+                                if line_end < 0:
+                                    break
+                                quoted ^= block.count(b'"', position, line_end) % 2 == 1
+                                position = line_end + 1
+                                if not quoted:
+                                    cut = position
+                        if cut is None:
+                            chunk_file.write(block)
+                            chunk_bytes += len(block)
+                            in_quotes ^= block.count(b'"') % 2 == 1
+                            block = csv_file.read(read_bytes)
+                        else:
+                            chunk_file.write(block[:cut])
+                            block = block[cut:] or csv_file.read(read_bytes)
+                            break
+                yield path_to_chunk
+            finally:
+                if path_to_chunk.exists():
+                    os.remove(path_to_chunk)
+
+
+ARROW_COLUMN_CONVERSIONS = {
+    TypeTag.TIMESTAMP: (
+        SqlType.big_int(),
+        "TIMESTAMP '1970-01-01 00:00:00' + {column} * INTERVAL '1 microsecond'",
+    ),
+    TypeTag.TIMESTAMP_TZ: (
+        SqlType.big_int(),
+        "TIMESTAMPTZ '1970-01-01 00:00:00+00' + {column} * INTERVAL '1 microsecond'",
+    ),
+    TypeTag.DATE: (SqlType.int(), "DATE '1970-01-01' + {column}"),
+    TypeTag.TIME: (
+        SqlType.big_int(),
+        "TIME '00:00:00' + {column} * INTERVAL '1 microsecond'",
+    ),
+    TypeTag.NUMERIC: (SqlType.text(), "{column}::{type}"),
+}
+"""
+    ARROW_COLUMN_CONVERSIONS (dict): For Hyper column types that are slow to build from Python
+        objects, the type that arrow_batch_rows sends instead (microseconds or days since the
+        epoch, or decimal text) and the Hyper expression that converts it back on insert
+"""
+
+
+def arrow_inserter_columns(target_table_def):
+    """
+    Returns (inserter_definition, column_mappings) for an Inserter that receives rows from
+    arrow_batch_rows, see ARROW_COLUMN_CONVERSIONS
+    """
+    inserter_definition = []
+    column_mappings = []
+    for column in target_table_def.columns:
+        conversion = ARROW_COLUMN_CONVERSIONS.get(column.type.tag)
+        if conversion is None:
+            inserter_definition.append(column)
+            column_mappings.append(Inserter.ColumnMapping(column.name))
+            continue
+        insert_type, expression = conversion
+        inserter_definition.append(
+            TableDefinition.Column(column.name, insert_type, column.nullability)
+        )
+        column_mappings.append(
+            Inserter.ColumnMapping(
+                column.name,
+                expression.format(
+                    column=column.name, type=sql_type_name(column.type)
+                ),
+            )
+        )
+    return inserter_definition, column_mappings
+
+
+def arrow_batch_rows(record_batch, target_table_def):
+    """
+    Converts an Arrow record batch, one whole column at a time, to a list of row tuples for
+    an Inserter created with arrow_inserter_columns(target_table_def)
+    The record batch columns must be in the same order as target_table_def.columns
+    """
+    columns = []
+    for column, array in zip(target_table_def.columns, record_batch.columns):
+        type_tag = column.type.tag
+        if type_tag in (TypeTag.TIMESTAMP, TypeTag.TIMESTAMP_TZ):
+            array = array.cast(pyarrow.timestamp("us", tz=array.type.tz)).cast(
+                pyarrow.int64()
+            )
+        elif type_tag == TypeTag.DATE:
+            array = array.cast(pyarrow.date32()).cast(pyarrow.int32())
+        elif type_tag == TypeTag.TIME:
+            array = array.cast(pyarrow.time64("us")).cast(pyarrow.int64())
+        elif type_tag == TypeTag.NUMERIC:
+            array = array.cast(pyarrow.string())
+        columns.append(array.to_pylist())
+    return list(zip(*columns))
+
+
+def new_inserter(connection, target_table_def, inserter_columns=None):
+    """
+    Returns an Inserter for target_table_def, mapping input columns with inserter_columns
+    (as returned by arrow_inserter_columns) if set
+    """
+    if inserter_columns is None:
+        return Inserter(connection, target_table_def)
+    inserter_definition, column_mappings = inserter_columns
+    return Inserter(
+        connection,
+        target_table_def,
+        columns=column_mappings,
+        inserter_definition=inserter_definition,
+    )
+
+
+def file_list_sql(paths):
+    """
+    Returns a SQL string literal for one path, or an ARRAY of literals for several paths
+    """
+    if len(paths) == 1:
+        return escape_string_literal(str(paths[0]))
+    return "ARRAY[{}]".format(
+        ", ".join(escape_string_literal(str(path)) for path in paths)
+    )
+
+
+def copy_csv_command(paths_to_csv, target_table_def):
+    """
+    Returns a COPY command that loads one or more CSV files (read in parallel by Hyper)
+    The files must have a header row and all be compressed the same way
+    """
+    copy_options = f"{CSV_OPTIONS}, header"
+    if csv_compression(paths_to_csv[0]):
+        copy_options += f", compression '{csv_compression(paths_to_csv[0])}'"
+    return (
+        f"COPY {target_table_def.table_name} from {file_list_sql(paths_to_csv)} "
+        f"with ({copy_options})"
+    )
+
+
+def insert_parquet_command(paths_to_parquet, target_table_def):
+    """
+    Returns an INSERT command that loads one or more parquet files
+    """
+    # Cast each column as parquet types may be wider than the target schema
+    # (e.g. BigQuery NUMERIC is exported as decimal(38,9))
+    select_list = ", ".join(
+        "{0}::{1} AS {0}".format(column.name, sql_type_name(column.type))
+        for column in target_table_def.columns
+    )
+    return (
+        f"INSERT INTO {target_table_def.table_name} SELECT {select_list} "
+        f"FROM external({file_list_sql(paths_to_parquet)}, FORMAT => 'parquet')"
+    )
+
+
+def load_files_command(paths, target_table_def, file_format="csv"):
+    """
+    Returns the command that loads CSV or parquet files (file_format="csv"|"parquet")
+    """
+    if file_format.lower() == "parquet":
+        return insert_parquet_command(paths, target_table_def)
+    return copy_csv_command(paths, target_table_def)
+
+
+_worker_hyper_process = None
+_worker_row_queue = None
+
+
+def _hyper_worker_init(row_queue=None):
+    """
+    Starts the Hyper process used by a worker process of a HYPER_WORKER_PROCESSES pool
+
+    row_queue (multiprocessing.Queue): Shared queue of row batches for _hyper_worker_write_rows
+    """
+    global _worker_hyper_process, _worker_row_queue
+    _worker_row_queue = row_queue
+    _worker_hyper_process = HyperProcess(telemetry=TELEMETRY)
+    # Worker processes do not run atexit handlers, shut Hyper down with the process
+    multiprocessing.util.Finalize(None, _worker_hyper_process.close, exitpriority=10)
+
+
+def _hyper_worker_load_files(paths, path_to_database, target_table_def, file_format):
+    """
+    Runs in a worker process: loads CSV or parquet files into a new Hyper file
+    Returns the number of rows loaded
+    """
+    with Connection(
+        endpoint=_worker_hyper_process.endpoint,
+        database=path_to_database,
+        create_mode=CreateMode.CREATE_AND_REPLACE,
+        parameters=HYPER_CONNECTION_PARAMETERS,
+    ) as connection:
+        connection.catalog.create_schema(schema=target_table_def.table_name.schema_name)
+        connection.catalog.create_table(table_definition=target_table_def)
+        return connection.execute_command(
+            command=load_files_command(paths, target_table_def, file_format)
+        )
+
+
+def _hyper_worker_write_rows(path_to_database, target_table_def, inserter_columns=None):
+    """
+    Runs in a worker process: inserts row batches from the shared row queue into a new Hyper
+    file until a None batch is received (see new_inserter for inserter_columns)
+    Returns the number of rows inserted
+    """
+    row_count = 0
+    with Connection(
+        endpoint=_worker_hyper_process.endpoint,
+        database=path_to_database,
+        create_mode=CreateMode.CREATE_AND_REPLACE,
+        parameters=HYPER_CONNECTION_PARAMETERS,
+    ) as connection:
+        connection.catalog.create_schema(schema=target_table_def.table_name.schema_name)
+        connection.catalog.create_table(table_definition=target_table_def)
+        with new_inserter(connection, target_table_def, inserter_columns) as inserter:
+            for batch in iter(_worker_row_queue.get, None):
+                inserter.add_rows(batch)
+                row_count += len(batch)
+            inserter.execute()
+    return row_count
+
+
+def prefetch(iterable, func=None, maxsize=PIPELINE_QUEUE_SIZE, discard=None):
+    """
+    Runs one pipeline stage in a background thread
+    Yields func(item) (or item if func is None) for each item in iterable, in order, holding
+    at most maxsize results ready in a queue.  Exceptions are re-raised to the consumer.
+
+    iterable (iterable): Source items, iterated by the background thread
+    func (callable): Applied to each item by the background thread
+    maxsize (int): Maximum number of results waiting for the consumer
+    discard (callable): Called with each result that was produced but never consumed because
+        the consumer stopped early (e.g. to remove a temporary file)
+    """
+    results = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                result = item if func is None else func(item)
+                if not put((result, None)):
+                    if discard is not None:
+                        discard(result)
+                    return
+            put((finished, None))
+        except BaseException as ex:
+            put((finished, ex))
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            result, error = results.get()
+            if result is finished:
+                if error is not None:
+                    raise error
+                return
+            yield result
+    finally:
+        stop.set()
+        producer.join()
+        while not results.empty():
+            result, error = results.get_nowait()
+            if result is not finished and discard is not None:
+                discard(result)
+
+
 class BaseExtractor(ABC):
     """
     Abstract Base Class defining the standard Extractor Interface
@@ -179,10 +661,106 @@ class BaseExtractor(ABC):
                 site_id=tableau_site_id,
             )
         self.tableau_server = TSC.Server(tableau_hostname, use_server_version=True)
+        # Share one pooled keep-alive HTTP session between TSC and the REST helpers
+        self.http_session = REST.configure_session(self.tableau_server.session)
         self.tableau_server.auth.sign_in(self.tableau_auth)
         self.tableau_project_name = tableau_project
+        self._datasource_ids = {}
         self.tableau_project_id = self._get_project_id(tableau_project)
         self.staging_bucket = staging_bucket
+        self._hyper = None
+        self._hyper_lock = threading.RLock()
+        self._hyper_connections = 0
+        self._hyper_check_health = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Shuts down the shared Hyper process and signs out of Tableau Server
+        """
+        self._shutdown_hyper_process()
+        self.tableau_server.auth.sign_out()
+
+    def _hyper_process(self):
+        """
+        Returns the Hyper process shared by all file operations of this extractor.
+        The process is started on first use.  After a Hyper error it is health checked once no
+        connection to it is open, and restarted if the check fails.
+        """
+        with self._hyper_lock:
+            if (
+                self._hyper is not None
+                and self._hyper_check_health
+                and self._hyper_connections == 0
+            ):
+                self._hyper_check_health = False
+                if not self._hyper_process_is_healthy():
+                    logger.warning("Hyper process failed health check - restarting")
+                    self._shutdown_hyper_process(lock=False)
+            if self._hyper is None:
+                self._hyper = HyperProcess(telemetry=TELEMETRY)
+                logger.info(
+                    "Started Hyper process at endpoint {}".format(self._hyper.endpoint)
+                )
+            return self._hyper
+
+    @contextlib.contextmanager
+    def _hyper_connection(self, **kwargs):
+        """
+        Opens a Connection to the shared Hyper process, which is not restarted while the
+        connection is open.  A HyperException raised while the connection is open schedules a
+        health check of the process.
+
+        kwargs: Passed to Connection (e.g. database, create_mode, parameters)
+        """
+        with self._hyper_lock:
+            hyper = self._hyper_process()
+            self._hyper_connections += 1
+        try:
+            with Connection(endpoint=hyper.endpoint, **kwargs) as connection:
+                yield connection
+        except HyperException:
+            self._hyper_check_health = True
+            raise
+        finally:
+            with self._hyper_lock:
+                self._hyper_connections -= 1
+
+    def _hyper_process_is_healthy(self):
+        """
+        Returns True if the shared Hyper process is running and accepting connections
+        """
+        if not self._hyper.is_open:
+            return False
+        try:
+            with Connection(endpoint=self._hyper.endpoint) as connection:
+                connection.execute_scalar_query(query="SELECT 1")
+        except HyperException as e:
+            logger.warning("Hyper process health check failed: {}".format(e))
+            return False
+        return True
+
+    def _shutdown_hyper_process(self, lock=True):
+        """
+        Shuts down the shared Hyper process if it is running
+        """
+        if lock:
+            with self._hyper_lock:
+                self._shutdown_hyper_process(lock=False)
+            return
+        if self._hyper is not None:
+            try:
+                if self._hyper.is_open:
+                    self._hyper.shutdown()
+                logger.info("The Hyper process has been shut down.")
+            except HyperException as e:
+                logger.warning("Error shutting down Hyper process: {}".format(e))
+            self._hyper = None
 
     def _datasource_lock(self, tab_ds_name):
         """
@@ -199,14 +777,96 @@ class BaseExtractor(ABC):
         )
         return FileLock(lock_path, timeout=DATASOURCE_LOCK_TIMEOUT)
 
+    def _incremental_lock(self, tab_ds_name):
+        """
+        Returns a posix lock that serializes incremental_append runs for the named datasource.
+        This is separate from _datasource_lock, which is taken for each PATCH within a run.
+        """
+        lock_path = "{}.{}.{}.incremental.lock".format(
+            DATASOURCE_LOCKFILE_PREFIX, self.tableau_project_id, tab_ds_name
+        )
+        return FileLock(lock_path, timeout=DATASOURCE_LOCK_TIMEOUT)
+
+    def _extract_state_path(self, tab_ds_name):
+        """
+        Returns the path of the extract state file for the named datasource
+        """
+        return "{}.{}.{}.json".format(
+            EXTRACT_STATE_PREFIX, self.tableau_project_id, tab_ds_name
+        )
+
+    def _get_extract_state(self, tab_ds_name, key, default=None):
+        """
+        Returns the value recorded for key in the extract state of the named datasource,
+        or default if nothing has been recorded
+        """
+        path_to_state = self._extract_state_path(tab_ds_name)
+        if not os.path.exists(path_to_state):
+            return default
+        with open(path_to_state, "r") as state_file:
+            return json.load(state_file).get(key, default)
+
+    def _set_extract_state(self, tab_ds_name, key, value):
+        """
+        Records value for key in the extract state of the named datasource (None clears key)
+        The state file is replaced atomically so an interrupted run never leaves it half written
+        """
+        path_to_state = self._extract_state_path(tab_ds_name)
+        os.makedirs(os.path.dirname(path_to_state), exist_ok=True)
+        with FileLock(
+            "{}.lock".format(path_to_state), timeout=DATASOURCE_LOCK_TIMEOUT
+        ):
+            state = {}
+            if os.path.exists(path_to_state):
+                with open(path_to_state, "r") as state_file:
+                    state = json.load(state_file)
+            if value is None:
+                state.pop(key, None)
+            else:
+                state[key] = value
+            path_to_temp_state = "{}.{}".format(path_to_state, uuid.uuid4().hex)
+            with open(path_to_temp_state, "w") as state_file:
+                json.dump(state, state_file, indent=2)
+            os.replace(path_to_temp_state, path_to_state)
+        logger.info(
+            "Recorded extract state {}={} for datasource {}".format(
+                key, value, tab_ds_name
+            )
+        )
+
+    def _name_request_options(self, name, project_name=None):
+        """
+        Returns TSC.RequestOptions that filter on name (and project_name) server side
+
+        Names containing characters that break the TSC filter syntax are filtered on
+        project only and must be matched by the caller.
+        """
+        req_option = TSC.RequestOptions(pagesize=LOOKUP_PAGE_SIZE)
+        if not any(c in name for c in ",:"):
+            req_option.filter.add(
+                TSC.Filter(
+                    TSC.RequestOptions.Field.Name,
+                    TSC.RequestOptions.Operator.Equals,
+                    name,
+                )
+            )
+        if project_name is not None and not any(c in project_name for c in ",:"):
+            req_option.filter.add(
+                TSC.Filter(
+                    TSC.RequestOptions.Field.ProjectName,
+                    TSC.RequestOptions.Operator.Equals,
+                    project_name,
+                )
+            )
+        return req_option
+
     def _get_project_id(self, tab_project):
         """
         Return project_id for tab_project
         """
         # Get project_id from project_name
-        all_projects, pagination_item = self.tableau_server.projects.get()
-
-        for project in all_projects:
+        req_option = self._name_request_options(tab_project)
+        for project in TSC.Pager(self.tableau_server.projects, req_option):
             if project.name == tab_project:
                 return project.id
 
@@ -217,30 +877,74 @@ class BaseExtractor(ABC):
 
     def _get_datasource_id(self, tab_datasource):
         """
-        Return id for tab_datasource
+        Return id for tab_datasource in the extractor's project
+
+        Lookups are cached for LOOKUP_CACHE_TTL seconds
         """
-        # Get project_id from project_name
+        cached_id, expires_at = self._datasource_ids.get(tab_datasource, (None, 0))
+        if time.monotonic() < expires_at:
+            return cached_id
 
-        all_datasources, pagination_item = self.tableau_server.datasources.get()
-        for datasource in all_datasources:
-            if datasource.name == tab_datasource:
+        req_option = self._name_request_options(
+            tab_datasource, self.tableau_project_name
+        )
+        for datasource in TSC.Pager(self.tableau_server.datasources, req_option):
+            if (
+                datasource.name == tab_datasource
+                and datasource.project_id == self.tableau_project_id
+            ):
+                self._cache_datasource_id(tab_datasource, datasource.id)
                 return datasource.id
 
+        self._datasource_ids.pop(tab_datasource, None)
         raise TableauResourceNotFoundError(
             "No datasource found for:{}".format(tab_datasource)
         )
 
-    def _wait_for_async_job(self, async_job_id):
+    def _cache_datasource_id(self, tab_datasource, datasource_id):
+        """
+        Adds or replaces the cached id for tab_datasource
+        """
+        self._datasource_ids[tab_datasource] = (
+            datasource_id,
+            time.monotonic() + LOOKUP_CACHE_TTL,
+        )
+
+    def _wait_for_async_job(self, async_job_id, timeout=ASYNC_JOB_TIMEOUT):
         """
         Waits for async job to complete and returns finish_code
+
+        Polls quickly at first and backs off exponentially (with jitter) up to
+        ASYNC_JOB_POLL_MAX_INTERVAL, never sleeping much longer than the time to
+        completion estimated from the job's progress.
+
+        async_job_id (string): ID of the Tableau Server job
+        timeout (int): Raise TableauJobTimeoutError after this many seconds (default=ASYNC_JOB_TIMEOUT)
         """
 
+        wait_started = time.monotonic()
+        poll_interval = ASYNC_JOB_POLL_INTERVAL
+        poll_count = 0
         completed_at = None
         finish_code = None
         jobinfo = None
         while completed_at is None:
-            time.sleep(ASYNC_JOB_POLL_INTERVAL)
+            sleep_time = poll_interval * random.uniform(
+                1 - ASYNC_JOB_POLL_JITTER, 1 + ASYNC_JOB_POLL_JITTER
+            )
+            if timeout is not None:
+                remaining_timeout = timeout - (time.monotonic() - wait_started)
+                if remaining_timeout <= 0:
+                    raise TableauJobTimeoutError(
+                        "Job {} did not complete within {} seconds (progress={})".format(
+                            async_job_id, timeout, jobinfo.progress if jobinfo else None
+                        )
+                    )
+                sleep_time = min(sleep_time, remaining_timeout)
+            time.sleep(sleep_time)
+
             jobinfo = self.tableau_server.jobs.get_by_id(async_job_id)
+            poll_count += 1
             completed_at = jobinfo.completed_at
             finish_code = jobinfo.finish_code
             logger.info(
@@ -249,91 +953,545 @@ class BaseExtractor(ABC):
                 )
             )
 
+            poll_interval = min(
+                poll_interval * ASYNC_JOB_POLL_BACKOFF, ASYNC_JOB_POLL_MAX_INTERVAL
+            )
+            try:
+                progress = float(jobinfo.progress)
+            except (TypeError, ValueError):
+                progress = 0
+            if 0 < progress < 100:
+                elapsed = time.monotonic() - wait_started
+                estimated_remaining = elapsed * (100 - progress) / progress
+                poll_interval = min(poll_interval, estimated_remaining / 2)
+            poll_interval = max(poll_interval, ASYNC_JOB_POLL_INTERVAL)
+
+        wait_duration = time.monotonic() - wait_started
+        server_duration = None
+        if jobinfo.started_at is not None:
+            server_duration = (completed_at - jobinfo.started_at).total_seconds()
         logger.info(
             "Job {} Completed: Finish Code: {} Notes: {}".format(
                 async_job_id, finish_code, jobinfo.notes
             )
         )
+        logger.info(
+            "Job {} waited {:.1f}s over {} polls, server side duration {}s".format(
+                async_job_id, wait_duration, poll_count, server_duration
+            )
+        )
         return finish_code
 
-    def _query_result_to_hyper_files(self, query_result_iter, target_table_def):
+    def _query_result_to_hyper_files(
+        self,
+        query_result_iter,
+        target_table_def,
+        max_rows_per_file=MAX_ROWS_PER_FILE,
+        max_bytes_per_file=MAX_BYTES_PER_FILE,
+        inserter_columns=None,
+    ):
         """
         Writes query output to one or more Hyper files
-        Returns a list of output Hyper files
+        Yields each output Hyper file as soon as it is written and closed, so that it can be
+        uploaded while the next file is written.  The caller is responsible for removing each file.
 
         query_result_iter (obj): Iterator containing result rows
         target_table_def (TableDefinition): Schema for target extract table
+        max_rows_per_file (int): Start a new file after this many rows (default=MAX_ROWS_PER_FILE)
+        max_bytes_per_file (int): Start a new file once the current file reaches this size on
+            disk, which lags behind buffered writes so files may overshoot it
+            (default=MAX_BYTES_PER_FILE)
+        inserter_columns (tuple): Input columns and mappings when rows are not in target table
+            format, e.g. from arrow_inserter_columns (default=None)
         """
-        output_hyper_files = []
-        # TODO: Split output into smaller files when query result > MAX_ROWS_PER_FILE
-        path_to_database = Path(tempfile_name(prefix="temp_", suffix=".hyper"))
-        output_hyper_files.append(path_to_database)
+        file_count = 0
+        result_rows = iter(query_result_iter())
+        # Holds the first row of the next file, read ahead to detect the end of the result
+        pending_rows = list(itertools.islice(result_rows, 1))
 
-        with HyperProcess(telemetry=TELEMETRY) as hyper:
+        # Always write at least one file so that an empty result still has a schema
+        while pending_rows or not file_count:
+            path_to_database = Path(tempfile_name(prefix="temp_", suffix=".hyper"))
+            file_count += 1
 
             # Creates new Hyper extract file
             # Replaces file with CreateMode.CREATE_AND_REPLACE if it already exists.
-            with Connection(
-                endpoint=hyper.endpoint,
-                database=path_to_database,
-                create_mode=CreateMode.CREATE_AND_REPLACE,
-            ) as connection:
+            try:
+                with self._hyper_connection(
+                    database=path_to_database,
+                    create_mode=CreateMode.CREATE_AND_REPLACE,
+                ) as connection:
+
+                    connection.catalog.create_schema(
+                        schema=target_table_def.table_name.schema_name
+                    )
+                    connection.catalog.create_table(table_definition=target_table_def)
+
+                    row_count = 0
+                    while True:
+                        batch_size = INSERTER_BATCH_ROWS
+                        if max_rows_per_file is not None:
+                            batch_size = min(batch_size, max_rows_per_file - row_count)
+                        batch = pending_rows + list(
+                            itertools.islice(result_rows, batch_size - len(pending_rows))
+                        )
+                        pending_rows = []
+                        if not batch:
+                            break
+                        with new_inserter(
+                            connection, target_table_def, inserter_columns
+                        ) as inserter:
+                            inserter.add_rows(batch)
+                            inserter.execute()
+                        row_count += len(batch)
+
+                        if (
+                            max_rows_per_file is not None
+                            and row_count >= max_rows_per_file
+                        ) or (
+                            max_bytes_per_file is not None
+                            and path_to_database.stat().st_size >= max_bytes_per_file
+                        ):
+                            break
+
+                    logger.info(
+                        f"The number of rows in table {target_table_def.table_name} "
+                        f"in {path_to_database} is {row_count}."
+                    )
 
-                connection.catalog.create_schema(
-                    schema=target_table_def.table_name.schema_name
-                )
-                connection.catalog.create_table(table_definition=target_table_def)
-                with Inserter(connection, target_table_def) as inserter:
-                    inserter.add_rows(query_result_iter())
-                    inserter.execute()
+                logger.info("The connection to the Hyper file has been closed.")
+                pending_rows = list(itertools.islice(result_rows, 1))
+            except BaseException:
+                if path_to_database.exists():
+                    os.remove(path_to_database)
+                raise
+            yield path_to_database
 
-                row_count = connection.execute_scalar_query(
-                    query=f"SELECT COUNT(*) FROM {target_table_def.table_name}"
+    def _query_result_to_hyper_files_in_workers(
+        self,
+        query_result_iter,
+        target_table_def,
+        workers=None,
+        inserter_columns=None,
+    ):
+        """
+        Writes query output to one Hyper file per worker process.  Result rows are read in
+        batches of INSERTER_BATCH_ROWS and shared across the workers through a queue, so that
+        converting rows for the Hyper Inserter is spread over several cores.
+        Returns a list of output Hyper files (row order across files is not preserved)
+
+        query_result_iter (obj): Iterator containing result rows
+        target_table_def (TableDefinition): Schema for target extract table
+        workers (int): Number of worker processes (default=HYPER_WORKER_PROCESSES)
+        inserter_columns (tuple): Input columns and mappings when rows are not in target table
+            format, e.g. from arrow_inserter_columns (default=None)
+        """
+        if workers is None:
+            workers = HYPER_WORKER_PROCESSES
+        workers = max(workers, 1)
+        mp_context = multiprocessing.get_context("spawn")
+        row_queue = mp_context.Queue(maxsize=2 * workers)
+        output_hyper_files = [
+            Path(tempfile_name(prefix="temp_", suffix=".hyper")) for _ in range(workers)
+        ]
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp_context,
+            initializer=_hyper_worker_init,
+            initargs=(row_queue,),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _hyper_worker_write_rows, path, target_table_def, inserter_columns
                 )
+                for path in output_hyper_files
+            ]
+
+            def put(batch):
+                while True:
+                    try:
+                        row_queue.put(batch, timeout=1)
+                        return
+                    except queue.Full:
+                        # Stop feeding rows if a worker has failed
+                        for future in futures:
+                            if future.done() and future.exception() is not None:
+                                raise future.exception()
+
+            completed = False
+            try:
+                result_rows = iter(query_result_iter())
+                while True:
+                    # Plain tuples are cheaper to pickle than source row objects
+                    batch = [
+                        tuple(row)
+                        for row in itertools.islice(result_rows, INSERTER_BATCH_ROWS)
+                    ]
+                    if not batch:
+                        break
+                    put(batch)
+                completed = True
+            finally:
+                if not completed:
+                    # Discard queued rows so that the workers reach their end of input
+                    while True:
+                        try:
+                            row_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                # One end of input marker per worker
+                for _ in futures:
+                    while not all(future.done() for future in futures):
+                        try:
+                            row_queue.put(None, timeout=1)
+                            break
+                        except queue.Full:
+                            pass
+                concurrent.futures.wait(futures)
+                if not completed or any(
+                    future.exception() is not None for future in futures
+                ):
+                    for path in output_hyper_files:
+                        if path.exists():
+                            os.remove(path)
+
+            for path, future in zip(output_hyper_files, futures):
                 logger.info(
-                    f"The number of rows in table {target_table_def.table_name} is {row_count}."
+                    f"Inserted {future.result()} into table {target_table_def.table_name} in {path}"
                 )
-
-            logger.info("The connection to the Hyper file has been closed.")
-        logger.info("The Hyper process has been shut down.")
         return output_hyper_files
 
-    def _csv_to_hyper_files(self, path_to_csv, target_table_def):
+    def _csv_to_hyper_files(
+        self, path_to_csv, target_table_def, max_bytes_per_file=MAX_BYTES_PER_FILE
+    ):
         """
         Writes csv to one or more Hyper files
         Returns a list of output Hyper files
 
-        path_to_csv (string): CSV file containing result rows
+        path_to_csv (string): CSV file containing result rows (may be gzip compressed)
         target_table_def (TableDefinition): Schema for target extract table
+        max_bytes_per_file (int): Split CSV files larger than this into several Hyper files,
+            each holding a run of consecutive lines from the CSV (default=MAX_BYTES_PER_FILE)
+
+        NOTE: A split CSV is cut at line ends into chunks of about max_bytes_per_file, which are
+            written uncompressed to disk one at a time and each loaded with COPY into its own
+            Hyper file.  Peak disk use is the CSV, one chunk and the output Hyper files.
         """
+        csv_bytes = os.path.getsize(path_to_csv)
+        if max_bytes_per_file is None or csv_bytes <= max_bytes_per_file:
+            path_to_database = Path(tempfile_name(prefix="temp_", suffix=".hyper"))
+            self._copy_csv_to_hyper_file(path_to_csv, path_to_database, target_table_def)
+            return [path_to_database]
+
         output_hyper_files = []
-        # TODO: Split output into smaller files when csv contains > MAX_ROWS_PER_FILE
+        try:
+            for path_to_chunk in split_csv_file(path_to_csv, max_bytes_per_file):
+                path_to_database = Path(tempfile_name(prefix="temp_", suffix=".hyper"))
+                output_hyper_files.append(path_to_database)
+                self._copy_csv_to_hyper_file(
+                    path_to_chunk, path_to_database, target_table_def
+                )
+        except BaseException:
+            for path_to_database in output_hyper_files:
+                if path_to_database.exists():
+                    os.remove(path_to_database)
+            raise
+        return output_hyper_files
+
+    @contextlib.contextmanager
+    def _create_hyper_file(self, path_to_database, target_table_def):
+        """
+        Creates a new Hyper file containing an empty table for target_table_def
+        Yields an open Connection to the new file
+
+        path_to_database (Path): Hyper file to create
+        target_table_def (TableDefinition): Schema for target extract table
+        """
+        with self._hyper_connection(
+            database=path_to_database,
+            create_mode=CreateMode.CREATE_AND_REPLACE,
+            parameters=HYPER_CONNECTION_PARAMETERS,
+        ) as connection:
+            connection.catalog.create_schema(
+                schema=target_table_def.table_name.schema_name
+            )
+            connection.catalog.create_table(table_definition=target_table_def)
+            yield connection
+
+    def _copy_csv_to_hyper_file(self, path_to_csv, path_to_database, target_table_def):
+        """
+        Creates a new Hyper file and loads a CSV file into it with COPY
+
+        path_to_csv (string): CSV file containing result rows (may be gzip compressed)
+        path_to_database (Path): Hyper file to create
+        target_table_def (TableDefinition): Schema for target extract table
+        """
+        with self._create_hyper_file(path_to_database, target_table_def) as connection:
+            count_rows = connection.execute_command(
+                command=copy_csv_command([path_to_csv], target_table_def)
+            )
+            logger.info(
+                f"Inserted {count_rows} into table {target_table_def.table_name} in {path_to_database}"
+            )
+        logger.debug("The connection to the Hyper file has been closed.")
+
+    def _parquet_to_hyper_files(self, path_to_parquet, target_table_def):
+        """
+        Writes a parquet file to a new Hyper file
+        Returns a list of output Hyper files
+
+        path_to_parquet (string): Parquet file containing result rows
+        target_table_def (TableDefinition): Schema for target extract table
+        """
         path_to_database = Path(tempfile_name(prefix="temp_", suffix=".hyper"))
-        output_hyper_files.append(path_to_database)
-
-        with HyperProcess(telemetry=TELEMETRY) as hyper:
-            with Connection(
-                endpoint=hyper.endpoint,
-                database=path_to_database,
-                create_mode=CreateMode.CREATE_AND_REPLACE,
-                parameters=HYPER_CONNECTION_PARAMETERS,
+        with self._create_hyper_file(path_to_database, target_table_def) as connection:
+            count_rows = connection.execute_command(
+                command=insert_parquet_command([path_to_parquet], target_table_def)
+            )
+            logger.info(
+                f"Inserted {count_rows} into table {target_table_def.table_name} in {path_to_database}"
+            )
+        logger.debug("The connection to the Hyper file has been closed.")
+        return [path_to_database]
+
+    def _merge_files_to_hyper_file(
+        self,
+        paths,
+        target_table_def,
+        file_format="csv",
+        batch_files=MERGE_BATCH_FILES,
+    ):
+        """
+        Loads many CSV or parquet files into a single new Hyper file, removing each file once
+        it is loaded.  Files are loaded batch_files at a time with one multi-file statement
+        so that Hyper parses the files of a batch in parallel.
+        Returns the path of the new Hyper file
+
+        paths (iterable): CSV (may be gzip compressed) or parquet files containing result rows
+        target_table_def (TableDefinition): Schema for target extract table
+        file_format (string): "csv" or "parquet" (default="csv")
+        batch_files (int): Number of files to load per statement (default=MERGE_BATCH_FILES)
+        """
+        paths = iter(paths)
+        path_to_database = Path(tempfile_name(prefix="temp_", suffix=".hyper"))
+        try:
+            with self._create_hyper_file(
+                path_to_database, target_table_def
             ) as connection:
+                total_rows = 0
+                for batch in iter(lambda: list(itertools.islice(paths, batch_files)), []):
+                    try:
+                        count_rows = connection.execute_command(
+                            command=load_files_command(
+                                batch, target_table_def, file_format
+                            )
+                        )
+                    finally:
+                        for path in batch:
+                            os.remove(path)
+                    total_rows += count_rows
+                    logger.info(
+                        f"Inserted {count_rows} rows from {len(batch)} files into table "
+                        f"{target_table_def.table_name} in {path_to_database}"
+                    )
+            logger.info(
+                f"The number of rows in table {target_table_def.table_name} "
+                f"in {path_to_database} is {total_rows}."
+            )
+        except BaseException:
+            if path_to_database.exists():
+                os.remove(path_to_database)
+            raise
+        finally:
+            if hasattr(paths, "close"):
+                paths.close()
+        return path_to_database
+
+    def _files_to_hyper_files_in_workers(
+        self,
+        paths,
+        target_table_def,
+        file_format="csv",
+        workers=None,
+        merge=None,
+    ):
+        """
+        Builds one partial Hyper file per CSV or parquet file in a pool of worker processes,
+        each running its own Hyper process, and removes each input file once it is loaded.
+        Yields the partial Hyper files in the order of paths, or if merge is set a single
+        Hyper file that the partial files are merged into.  The caller is responsible for
+        removing each yielded file.
 
-                connection.catalog.create_schema(
-                    schema=target_table_def.table_name.schema_name
-                )
-                connection.catalog.create_table(table_definition=target_table_def)
+        paths (iterable): CSV (may be gzip compressed) or parquet files containing result rows
+        target_table_def (TableDefinition): Schema for target extract table
+        file_format (string): "csv" or "parquet" (default="csv")
+        workers (int): Number of worker processes (default=HYPER_WORKER_PROCESSES)
+        merge (bool): Attach the partial files to one new Hyper file and copy their rows into
+            it, so that each row is rewritten at most once (default=MERGE_PARTIAL_HYPER_FILES)
+        """
+        if workers is None:
+            workers = HYPER_WORKER_PROCESSES
+        if merge is None:
+            merge = MERGE_PARTIAL_HYPER_FILES
+        paths = iter(paths)
+        workers = max(workers, 1)
+        pending = collections.deque()  # (path, path_to_database, future) in input order
+        partial_files = []
+        try:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_hyper_worker_init,
+            ) as executor:
+                try:
+                    next_path = next(paths, None)
+                    while next_path is not None or pending:
+                        # Queue one file ahead for each worker
+                        while next_path is not None and len(pending) < 2 * workers:
+                            path_to_database = Path(
+                                tempfile_name(prefix="temp_", suffix=".hyper")
+                            )
+                            future = executor.submit(
+                                _hyper_worker_load_files,
+                                [next_path],
+                                path_to_database,
+                                target_table_def,
+                                file_format,
+                            )
+                            pending.append((next_path, path_to_database, future))
+                            next_path = next(paths, None)
+
+                        path, path_to_database, future = pending[0]
+                        count_rows = future.result()
+                        pending.popleft()
+                        os.remove(path)
+                        logger.info(
+                            f"Inserted {count_rows} into table {target_table_def.table_name} in {path_to_database}"
+                        )
+                        if merge:
+                            partial_files.append(path_to_database)
+                        else:
+                            yield path_to_database
+                finally:
+                    for path, path_to_database, future in pending:
+                        future.cancel()
+                    concurrent.futures.wait([future for _, _, future in pending])
+                    for path, path_to_database, future in pending:
+                        for pending_file in (path, path_to_database):
+                            if os.path.exists(pending_file):
+                                os.remove(pending_file)
+                    if hasattr(paths, "close"):
+                        paths.close()
+
+            if len(partial_files) > 1:
+                path_to_database = self._pack_hyper_files(partial_files)
+                for partial_file in partial_files:
+                    os.remove(partial_file)
+                partial_files = [path_to_database]
+            if partial_files:
+                path_to_database = partial_files.pop()
+                yield path_to_database
+        finally:
+            for partial_file in partial_files:
+                os.remove(partial_file)
+
+    def _upsert_actions_json(
+        self,
+        path_to_database,
+        match_columns=None,
+        match_conditions_json=None,
+        changeset_table_name="upserted_rows",
+    ):
+        """
+        Adds the distinct changeset keys table to a hyper file
+        Returns the delete and insert actions that upsert the changeset
 
-                count_rows = connection.execute_command(
-                    command=f"COPY {target_table_def.table_name} from {escape_string_literal(path_to_csv)} "
-                    f"with (format csv, NULL 'NULL', delimiter ',', header)"
-                )
-                logger.info(
-                    f"Inserted {count_rows} into table {target_table_def.table_name}"
-                )
-            logger.debug("The connection to the Hyper file has been closed.")
-        logger.debug("The Hyper process has been shut down.")
-        return output_hyper_files
+        path_to_database (string): The hyper file containing the changeset
+        match_columns (array of tuples): Array of (source_col, target_col) pairs
+        match_conditions_json (string): Define conditions for matching rows in json format.  See Hyper API guide for details.
+        changeset_table_name (string): The name of the table in the hyper file that contains the changeset (default="upserted_rows")
+        """
+        if match_columns is not None:
+            key_columns = [match_pair[0] for match_pair in match_columns]
+        else:
+            key_columns = []
+
+            def find_source_cols(condition):
+                if isinstance(condition, dict):
+                    if "source-col" in condition:
+                        key_columns.append(condition["source-col"])
+                    for value in condition.values():
+                        find_source_cols(value)
+                elif isinstance(condition, list):
+                    for value in condition:
+                        find_source_cols(value)
+
+            find_source_cols(match_conditions_json)
+        if not key_columns:
+            raise Exception("Upsert match condition must reference a source-col")
+
+        keys_table_name = "{}_keys".format(changeset_table_name)
+        with self._hyper_connection(database=path_to_database) as connection:
+            key_column_list = ", ".join(
+                escape_name(key_column) for key_column in dict.fromkeys(key_columns)
+            )
+            connection.execute_command(
+                command=f"CREATE TABLE {TableName('Extract', keys_table_name)} AS "
+                f"SELECT DISTINCT {key_column_list} FROM {TableName('Extract', changeset_table_name)}"
+            )
+
+        return [
+            self._changeset_action_json(
+                action="DELETE",
+                match_columns=match_columns,
+                match_conditions_json=match_conditions_json,
+                changeset_table_name=keys_table_name,
+            ),
+            self._changeset_action_json(
+                action="INSERT", changeset_table_name=changeset_table_name,
+            ),
+        ]
+
+    def _pack_hyper_files(self, hyper_files):
+        """
+        Copies the tables from several Hyper files into one new Hyper file.
+        Tables with the same schema and name in more than one file are appended.
+        Returns the path of the new Hyper file
+
+        hyper_files (list): Hyper files to pack
+        """
+        path_to_database = Path(tempfile_name(prefix="packed_", suffix=".hyper"))
+        with self._hyper_connection() as connection:
+            connection.catalog.create_database(path_to_database)
+            connection.catalog.attach_database(path_to_database, alias="packed")
+            for source_file in hyper_files:
+                connection.catalog.attach_database(source_file, alias="source")
+                try:
+                    for schema_name in connection.catalog.get_schema_names("source"):
+                        for table_name in connection.catalog.get_table_names(
+                            schema_name
+                        ):
+                            packed_table_name = TableName(
+                                "packed", schema_name.name, table_name.name
+                            )
+                            if not connection.catalog.has_table(packed_table_name):
+                                table_def = connection.catalog.get_table_definition(
+                                    table_name
+                                )
+                                table_def.table_name = packed_table_name
+                                connection.catalog.create_schema_if_not_exists(
+                                    packed_table_name.schema_name
+                                )
+                                connection.catalog.create_table(table_def)
+                            count_rows = connection.execute_command(
+                                command=f"INSERT INTO {packed_table_name} SELECT * FROM {table_name}"
+                            )
+                            logger.info(
+                                f"Packed {count_rows} rows from {source_file} into {packed_table_name}"
+                            )
+                finally:
+                    connection.catalog.detach_database("source")
+        return path_to_database
 
     def _publish_hyper_file(
         self,
@@ -362,6 +1520,8 @@ class BaseExtractor(ABC):
             datasource = self.tableau_server.datasources.publish(
                 datasource, path_to_database, publish_mode
             )
+        # Publishing may create or replace the datasource, refresh the cached id
+        self._cache_datasource_id(tab_ds_name, datasource.id)
         logger.info("Datasource published. Datasource ID: {0}".format(datasource.id))
         return datasource.id
 
@@ -390,6 +1550,36 @@ class BaseExtractor(ABC):
             (e.g. json_request="condition": { "op": "<", "target-col": "col1", "const": {"type": "datetime", "v": "2020-06-00"}})
         - When action is DELETE, it is an error if the source table contains any additional columns not referenced by the condition. Those columns are pointless and we want to let the user know, so they can fix their scripts accordingly.
         """
+        action_json = self._changeset_action_json(
+            action=action,
+            match_columns=match_columns,
+            match_conditions_json=match_conditions_json,
+            changeset_table_name=None
+            if path_to_database is None
+            else changeset_table_name,
+        )
+        self._patch_datasource(path_to_database, tab_ds_name, [action_json])
+
+    def _changeset_action_json(
+        self,
+        action,
+        match_columns=None,
+        match_conditions_json=None,
+        changeset_table_name=None,
+        target_table_name="Extract",
+    ):
+        """
+        Returns the json for one action of a Data Update (PATCH) request
+
+        action (string): One of "INSERT", "UPDATE" or "DELETE"
+        match_columns (array of tuples): Array of (source_col, target_col) pairs
+        match_conditions_json (string): Define conditions for matching rows in json format.  See Hyper API guide for details.
+        changeset_table_name (string): The name of the table in the hyper file that contains the changeset
+            (None for a conditional delete)
+        target_table_name (string): The name of the table in the datasource to change (default="Extract")
+
+        NOTE: match_columns overrides match_conditions_json if both are specified
+        """
         action = action.upper()
         match_conditions_args = []
         if match_columns is not None:
@@ -443,18 +1633,13 @@ class BaseExtractor(ABC):
             # FROM <source>
             # WHERE <condition>
             # -------
-            json_request = {
-                "actions": [
-                    # UPDATE action
-                    {
-                        "action": "update",
-                        "source-schema": "Extract",
-                        "source-table": changeset_table_name,
-                        "target-schema": "Extract",
-                        "target-table": "Extract",
-                        "condition": match_conditions_json,
-                    },
-                ]
+            action_json = {
+                "action": "update",
+                "source-schema": "Extract",
+                "source-table": changeset_table_name,
+                "target-schema": "Extract",
+                "target-table": target_table_name,
+                "condition": match_conditions_json,
             }
         elif action == "DELETE":
             # # The Delete operation deletes tuples from its target table.
@@ -502,31 +1687,21 @@ class BaseExtractor(ABC):
             # This variant is useful to delete many tuples, e.g., based on their row ID
             #
             # It is an error if the source table contains any additional columns not referenced by the condition. Those columns are pointless and we want to let the user know, so they can fix their scripts accordingly.
-            if path_to_database is None:
-                json_request = {
-                    "actions": [
-                        # UPDATE action
-                        {
-                            "action": "delete",
-                            "target-schema": "Extract",
-                            "target-table": "Extract",
-                            "condition": match_conditions_json,
-                        },
-                    ]
+            if changeset_table_name is None:
+                action_json = {
+                    "action": "delete",
+                    "target-schema": "Extract",
+                    "target-table": target_table_name,
+                    "condition": match_conditions_json,
                 }
             else:
-                json_request = {
-                    "actions": [
-                        # UPDATE action
-                        {
-                            "action": "delete",
-                            "source-schema": "Extract",
-                            "source-table": changeset_table_name,
-                            "target-schema": "Extract",
-                            "target-table": "Extract",
-                            "condition": match_conditions_json,
-                        },
-                    ]
+                action_json = {
+                    "action": "delete",
+                    "source-schema": "Extract",
+                    "source-table": changeset_table_name,
+                    "target-schema": "Extract",
+                    "target-table": target_table_name,
+                    "condition": match_conditions_json,
                 }
         elif action == "INSERT":
             # The "insert" operation appends one or more rows from a table inside the uploaded Hyper file into the updated Hyper file on the server.
@@ -540,33 +1715,62 @@ class BaseExtractor(ABC):
             # `target-schema` (string; required): analogous to target-schema, but for the source table
             # `source-table` (string; required): the table name inside the source database into which the data will be inserted
             # `source-schema` (string; required): the schema name inside the source database; default: the one, unique schema name inside the target database in case the target db has only one schema; error otherwise
-            json_request = {
-                "actions": [
-                    # INSERT action
-                    {
-                        "action": "insert",
-                        "source-schema": "Extract",
-                        "source-table": changeset_table_name,
-                        "target-schema": "Extract",
-                        "target-table": "Extract",
-                    },
-                ]
+            action_json = {
+                "action": "insert",
+                "source-schema": "Extract",
+                "source-table": changeset_table_name,
+                "target-schema": "Extract",
+                "target-table": target_table_name,
             }
         else:
             raise Exception(
-                "Unknown action {} specified for _update_datasource_from_hyper_file".format(
+                "Unknown action {} specified for _changeset_action_json".format(
                     action
                 )
             )
+        return action_json
+
+    def _patch_datasource(self, path_to_database, tab_ds_name, actions_json):
+        """
+        Uploads a hyper file and applies a list of actions to a datasource on Tableau Server
+        in a single PATCH request.  All actions run in one transaction on the server.
+
+        path_to_database (string): The hyper file containing the changeset tables (None if
+            no action references a source table)
+        tab_ds_name (string): Target Tableau datasource
+        actions_json (list): Actions as returned by _changeset_action_json
+        """
         file_upload_id = None
         if path_to_database is not None:
             # Update or delete by row_id
-            file_upload_id = REST.upload_file(
-                path_to_database,
-                self.tableau_hostname,
-                self.tableau_server.auth_token,
-                self.tableau_server.site_id,
-            )
+            file_upload_id = self._upload_hyper_file(path_to_database)
+        self._patch_datasource_upload(file_upload_id, tab_ds_name, actions_json)
+
+    def _upload_hyper_file(self, path_to_database):
+        """
+        Uploads a hyper file to Tableau Server
+        Returns the upload session ID
+
+        path_to_database (string): The hyper file containing the changeset tables
+        """
+        return REST.upload_file(
+            path_to_database,
+            self.tableau_hostname,
+            self.tableau_server.auth_token,
+            self.tableau_server.site_id,
+            session=self.http_session,
+        )
+
+    def _patch_datasource_upload(self, file_upload_id, tab_ds_name, actions_json):
+        """
+        Applies a list of actions to a datasource on Tableau Server in a single PATCH request
+        and waits for the job to finish
+
+        file_upload_id (string): Upload session ID from _upload_hyper_file (None if no action
+            references a source table)
+        tab_ds_name (string): Target Tableau datasource
+        actions_json (list): Actions as returned by _changeset_action_json
+        """
         ds_id = self._get_datasource_id(tab_ds_name)
         lock = self._datasource_lock(tab_ds_name)
         with lock:
@@ -576,7 +1780,8 @@ class BaseExtractor(ABC):
                 site_id=self.tableau_server.site_id,
                 datasource_id=ds_id,
                 file_upload_id=file_upload_id,
-                request_json=json_request,
+                request_json={"actions": actions_json},
+                session=self.http_session,
             )
             finish_code = self._wait_for_async_job(async_job_id)
             if finish_code != "0":
@@ -586,6 +1791,46 @@ class BaseExtractor(ABC):
                     )
                 )
 
+    def _patch_datasource_from_hyper_files(
+        self, hyper_files, tab_ds_name, hyper_file_actions
+    ):
+        """
+        Applies each hyper file in hyper_files to a datasource on Tableau Server with one PATCH
+        request per file, in order, and removes each file once applied.
+        hyper_files is iterated and each file uploaded in separate threads, so that the next
+        files are built and uploaded while the server job for the current file runs.
+
+        hyper_files (iterable): Hyper files containing the changeset tables
+        tab_ds_name (string): Target Tableau datasource
+        hyper_file_actions (callable): Called with each hyper file before it is uploaded and
+            returns the list of actions to apply with that file
+        """
+
+        def upload(path_to_database):
+            try:
+                actions_json = hyper_file_actions(path_to_database)
+                file_upload_id = self._upload_hyper_file(path_to_database)
+            except BaseException:
+                os.remove(path_to_database)
+                raise
+            return path_to_database, file_upload_id, actions_json
+
+        uploads = prefetch(
+            prefetch(hyper_files, discard=os.remove),
+            func=upload,
+            discard=lambda uploaded: os.remove(uploaded[0]),
+        )
+        try:
+            for path_to_database, file_upload_id, actions_json in uploads:
+                try:
+                    self._patch_datasource_upload(
+                        file_upload_id, tab_ds_name, actions_json
+                    )
+                finally:
+                    os.remove(path_to_database)
+        finally:
+            uploads.close()
+
     @abstractmethod
     def _hyper_sql_type(self, source_column):
         """
@@ -608,13 +1853,28 @@ class BaseExtractor(ABC):
         """
 
     @abstractmethod
-    def _query_to_hyper_files(self, sql_query, hyper_table_name="Extract"):
+    def _query_to_hyper_files(
+        self, sql_query, hyper_table_name="Extract", single_file=False
+    ):
         """
         Executes sql_query against the source database and writes the output to one or more Hyper files
-        Returns a list of output Hyper files
+        Returns an iterator of output Hyper files, each yielded once it is written
 
         sql_query (string): SQL to pass to the source database
         hyper_table_name (string): Name of the target Hyper table, default=Extract
+        single_file (bool): Write the whole result to one Hyper file, e.g. for a changeset
+            that must be applied in one transaction (default=False)
+        """
+
+    @abstractmethod
+    def _watermark_query(self, source_table, watermark_column, watermark=None):
+        """
+        Returns a query string that selects the rows of source_table whose watermark_column
+        is greater than watermark
+
+        source_table (string): Source table identifier
+        watermark_column (string): Column that increases for new or changed rows
+        watermark (string): Last applied value of watermark_column as text, None selects all rows
         """
 
     @abstractmethod
@@ -636,7 +1896,14 @@ class BaseExtractor(ABC):
 
     @abstractmethod
     def export_load(
-        self, source_table, tab_ds_name, publish_mode=TSC.Server.PublishMode.CreateNew
+        self,
+        source_table,
+        tab_ds_name,
+        publish_mode=TSC.Server.PublishMode.CreateNew,
+        single_file=None,
+        partitioned=False,
+        columns=None,
+        where=None,
     ):
         """
         Bulk export the contents of source_table and load to a Tableau Server
@@ -644,6 +1911,13 @@ class BaseExtractor(ABC):
         source_table (string): Source table identifier
         tab_ds_name (string): Target datasource name
         publish_mode: One of TSC.Server.[Overwrite|CreateNew] (default=CreateNew)
+        single_file (bool): Merge the export into one Hyper file and publish it once
+            (default=EXPORT_LOAD_SINGLE_FILE)
+        partitioned (bool): Export and load each partition of source_table as an independent
+            unit (default=False)
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
         """
 
     @abstractmethod
@@ -653,6 +1927,8 @@ class BaseExtractor(ABC):
         sql_query=None,
         source_table=None,
         changeset_table_name="new_rows",
+        columns=None,
+        where=None,
     ):
         """
         Appends the result of sql_query to a datasource on Tableau Server
@@ -662,6 +1938,9 @@ class BaseExtractor(ABC):
         source_table (string): Identifier for source table containing the changeset
         changeset_table_name (string): The name of the table in the hyper file that
             contains the changeset (default="new_rows")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
 
         NOTES:
         - Specify either sql_query OR source_table, error if both specified
@@ -676,6 +1955,8 @@ class BaseExtractor(ABC):
         match_columns=None,
         match_conditions_json=None,
         changeset_table_name="updated_rows",
+        columns=None,
+        where=None,
     ):
         """
         Updates a datasource on Tableau Server with the changeset from sql_query
@@ -688,28 +1969,48 @@ class BaseExtractor(ABC):
             See Hyper API guide for details.
         changeset_table_name (string): The name of the table in the hyper file that contains
             the changeset (default="updated_rows")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
 
         NOTES:
         - Specify either match_columns OR match_conditions_json, error if both specified
         - Specify either sql_query OR source_table, error if both specified
         """
 
-    # @abstractmethod
-    # def upsert_to_datasource(
-    #     self, sql_query, tab_ds_name, match_columns=None, match_conditions_json=None
-    # ):
-    #     """
-    #     TODO: NOT IMPLEMENTED YET IN PRERELEASE
-    #     Upsert/Merge the changeset from sql_query into a datasource on Tableau Server
-    #
-    #     sql_query (string): The query string that generates the changeset
-    #     tab_ds_name (string): Target datasource name
-    #     match_columns (array of tuples): Array of (source_col, target_col) pairs
-    #     match_conditions_json (string): Define conditions for matching rows in json format.  See Hyper API guide for details.
-    #     changeset_table_name (string): The name of the table in the hyper file that contains the changeset (default="updated_rows")
-    #
-    #     NOTE: match_columns overrides match_conditions_json if both are specified
-    #     """
+    @abstractmethod
+    def upsert_to_datasource(
+        self,
+        tab_ds_name,
+        sql_query=None,
+        source_table=None,
+        match_columns=None,
+        match_conditions_json=None,
+        changeset_table_name="upserted_rows",
+        columns=None,
+        where=None,
+    ):
+        """
+        Upsert/Merge the changeset from sql_query into a datasource on Tableau Server
+        Rows matching the changeset keys are deleted and the changeset is inserted in a
+        single transaction
+
+        tab_ds_name (string): Target datasource name
+        sql_query (string): The query string that generates the changeset
+        source_table (string): Identifier for source table containing the changeset
+        match_columns (array of tuples): Array of (source_col, target_col) pairs
+        match_conditions_json (string): Define conditions for matching rows in json format.
+            See Hyper API guide for details.
+        changeset_table_name (string): The name of the table in the hyper file that contains
+            the changeset (default="upserted_rows")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
+
+        NOTES:
+        - Specify either match_columns OR match_conditions_json, error if both specified
+        - Specify either sql_query OR source_table, error if both specified
+        """
 
     @abstractmethod
     def delete_from_datasource(
@@ -720,6 +2021,8 @@ class BaseExtractor(ABC):
         match_columns=None,
         match_conditions_json=None,
         changeset_table_name="deleted_rowids",
+        columns=None,
+        where=None,
     ):
         """
         Delete rows matching the changeset from sql_query from a datasource on Tableau Server
@@ -733,6 +2036,9 @@ class BaseExtractor(ABC):
             See Hyper API guide for details.
         changeset_table_name (string): The name of the table in the hyper file that contains
             the changeset (default="deleted_rowids")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
 
         NOTES:
         - match_columns overrides match_conditions_json if both are specified
@@ -743,6 +2049,190 @@ class BaseExtractor(ABC):
         - Specify either match_columns OR match_conditions_json, error if both specified
         """
 
+    def apply_changeset(self, tab_ds_name, actions):
+        """
+        Applies several actions to a datasource on Tableau Server with one upload and
+        one PATCH request.  The changeset tables for all actions are packed into a single
+        Hyper file and the actions run in order in one transaction on the server.
+
+        tab_ds_name (string): Target datasource name
+        actions (list of dict): The actions to apply, each with keys:
+            - action (string): One of "INSERT", "UPDATE" or "DELETE"
+            - sql_query (string): The query string that generates the changeset (optional)
+            - path_to_database (string): Existing hyper file containing the changeset table (optional)
+            - changeset_table_name (string): The name of the changeset table
+                (default=DEFAULT_CHANGESET_TABLE_NAMES[action])
+            - match_columns (array of tuples): Array of (source_col, target_col) pairs
+            - match_conditions_json (string): Define conditions for matching rows in json format.
+                See Hyper API guide for details.
+
+        NOTES:
+        - Specify either sql_query OR path_to_database, error if both specified
+        - An action without sql_query or path_to_database uses the changeset table of an
+            earlier action with the same changeset_table_name.  If there is none then the
+            action must be a conditional DELETE.
+        - Raises ValueError if more than one action with sql_query or path_to_database uses the
+            same changeset_table_name
+        - match_columns overrides match_conditions_json if both are specified
+        """
+        changeset_tables = set()
+        hyper_files = []
+        temp_hyper_files = []
+        actions_json = []
+        try:
+            for action in actions:
+                action_name = action["action"].upper()
+                sql_query = action.get("sql_query")
+                path_to_database = action.get("path_to_database")
+                changeset_table_name = action.get(
+                    "changeset_table_name",
+                    DEFAULT_CHANGESET_TABLE_NAMES.get(action_name),
+                )
+                if sql_query and path_to_database:
+                    raise Exception(
+                        "Must specify either sql_query OR path_to_database for {}".format(
+                            action_name
+                        )
+                    )
+                if (sql_query or path_to_database) and (
+                    changeset_table_name in changeset_tables
+                ):
+                    # Packed tables with the same name are appended, so each action would
+                    # apply the rows of both changesets
+                    raise ValueError(
+                        "Changeset table {} is specified by more than one action".format(
+                            changeset_table_name
+                        )
+                    )
+                if sql_query:
+                    output_hyper_files = list(
+                        self._query_to_hyper_files(
+                            sql_query, changeset_table_name, single_file=True
+                        )
+                    )
+                    temp_hyper_files.extend(output_hyper_files)
+                    hyper_files.extend(output_hyper_files)
+                    changeset_tables.add(changeset_table_name)
+                elif path_to_database:
+                    hyper_files.append(path_to_database)
+                    changeset_tables.add(changeset_table_name)
+                elif changeset_table_name not in changeset_tables:
+                    if action_name != "DELETE":
+                        raise Exception(
+                            "No changeset specified for {} action".format(action_name)
+                        )
+                    # Conditional delete
+                    changeset_table_name = None
+
+                actions_json.append(
+                    self._changeset_action_json(
+                        action=action_name,
+                        match_columns=action.get("match_columns"),
+                        match_conditions_json=action.get("match_conditions_json"),
+                        changeset_table_name=changeset_table_name,
+                    )
+                )
+
+            path_to_database = None
+            if len(hyper_files) == 1:
+                path_to_database = hyper_files[0]
+            elif hyper_files:
+                path_to_database = self._pack_hyper_files(hyper_files)
+                temp_hyper_files.append(path_to_database)
+            self._patch_datasource(path_to_database, tab_ds_name, actions_json)
+        finally:
+            for temp_hyper_file in temp_hyper_files:
+                os.remove(temp_hyper_file)
+
+    def _hyper_file_watermark(
+        self, path_to_database, changeset_table_name, watermark_column
+    ):
+        """
+        Returns the maximum value of watermark_column in a changeset table as text, or None if
+        the table is empty
+
+        path_to_database (string): The hyper file containing the changeset
+        changeset_table_name (string): The name of the changeset table
+        watermark_column (string): Column that increases for new or changed rows
+        """
+        with self._hyper_connection(database=path_to_database) as connection:
+            return connection.execute_scalar_query(
+                query=f"SELECT MAX({escape_name(watermark_column)})::TEXT "
+                f"FROM {TableName('Extract', changeset_table_name)}"
+            )
+
+    def incremental_append(
+        self,
+        tab_ds_name,
+        source_table,
+        watermark_column,
+        changeset_table_name="new_rows",
+        initial_watermark=None,
+    ):
+        """
+        Appends the rows of source_table that are past the high-water mark to a datasource on
+        Tableau Server.  The mark is the largest value of watermark_column applied so far, kept
+        in the extract state of the datasource, and is only advanced once the PATCH job has
+        finished successfully.  The changeset is written to one Hyper file and applied in one
+        PATCH request so it is either applied in full or not at all, and concurrent runs for
+        the same datasource are serialized with a lock.
+
+        tab_ds_name (string): Target datasource name
+        source_table (string): Source table identifier
+        watermark_column (string): Column that increases for new or changed rows, e.g. an
+            update timestamp or a monotonically increasing ID
+        changeset_table_name (string): The name of the table in the hyper file that
+            contains the changeset (default="new_rows")
+        initial_watermark (string): Mark to start from if none has been recorded for this
+            datasource (default=None - append all rows)
+
+        NOTES:
+        - Rows that are committed with a watermark_column value at or below the mark after it
+            has been recorded are not picked up by later runs
+        """
+        state_key = WATERMARK_STATE_KEY.format(source_table, watermark_column)
+        # Held from reading the mark until the new mark is recorded so that concurrent runs
+        # cannot append the same rows twice
+        with self._incremental_lock(tab_ds_name):
+            watermark = self._get_extract_state(
+                tab_ds_name, state_key, initial_watermark
+            )
+            logger.info(
+                "Appending rows of {} with {} > {}".format(
+                    source_table, watermark_column, watermark
+                )
+            )
+            sql_query = self._watermark_query(
+                source_table, watermark_column, watermark
+            )
+            # The changeset is written to one file so that it is applied in one PATCH
+            temp_hyper_files = list(
+                self._query_to_hyper_files(
+                    sql_query, changeset_table_name, single_file=True
+                )
+            )
+            try:
+                new_watermark = None
+                if temp_hyper_files:
+                    (path_to_database,) = temp_hyper_files
+                    new_watermark = self._hyper_file_watermark(
+                        path_to_database, changeset_table_name, watermark_column
+                    )
+                if new_watermark is None:
+                    logger.info("No rows past the mark in {}".format(source_table))
+                    return
+                actions_json = [
+                    self._changeset_action_json(
+                        action="INSERT", changeset_table_name=changeset_table_name
+                    )
+                ]
+                # Raises TableauJobError unless the job finishes with finish code 0
+                self._patch_datasource(path_to_database, tab_ds_name, actions_json)
+                self._set_extract_state(tab_ds_name, state_key, new_watermark)
+            finally:
+                for temp_hyper_file in temp_hyper_files:
+                    os.remove(temp_hyper_file)
+
 
 def main():
     pass
@@ -13,24 +13,38 @@ as a template to start your own projects.
 
 -----------------------------------------------------------------------------
 """
+import collections
+import concurrent.futures
+from datetime import datetime, timedelta, timezone
+import itertools
 import logging
-import subprocess
+import queue
 import os
+import threading
+import time
 import uuid
-from pathlib import Path
 import tableauserverclient as TSC
 from tableauhyperapi import TableDefinition, Nullability, SqlType, TableName
+import base_extractor
 from base_extractor import (
     BaseExtractor,
     HyperSQLTypeMappingError,
     DEFAULT_SITE_ID,
+    arrow_batch_rows,
+    arrow_inserter_columns,
     tempfile_name,
 )
 
-# from google.cloud.bigquery_storage import BigQueryReadClient
 from google.cloud import bigquery
 from google.cloud import storage
 
+try:
+    from google.cloud.bigquery_storage import BigQueryReadClient
+    from google.cloud.bigquery_storage import types as bqstorage_types
+except ImportError:
+    # Optional: query results are read with list_rows when the Storage API is not installed
+    BigQueryReadClient = None
+
 logger = logging.getLogger("hyper_samples.extractor.bigquery")
 
 bq_client = bigquery.Client()
@@ -38,6 +52,51 @@ bq_client = bigquery.Client()
 MAX_QUERY_SIZE = 100 * 1024 * 1024  # 100MB
 SAMPLE_ROWS = 1000
 
+# Read query results with the BigQuery Storage Read API when it is installed
+USE_STORAGE_API = True
+STORAGE_API_MAX_QUERY_SIZE = 10 * 1024 * 1024 * 1024  # 10GB - replaces MAX_QUERY_SIZE
+STORAGE_API_MAX_STREAMS = 8  # Number of streams to read in parallel
+STORAGE_API_QUEUE_SIZE = 16  # Arrow record batches buffered ahead of the Hyper writer
+
+# Read query results with concurrent tabledata.list page requests when the Storage API is not used
+LIST_ROWS_PAGE_SIZE = 10000  # Rows per page request
+LIST_ROWS_WORKERS = 4  # Number of pages fetched in parallel
+LIST_ROWS_PREFETCH_PAGES = 8  # Maximum pages fetched ahead of the Hyper writer
+
+# Bulk export format: "CSV" (GZIP compressed) or "PARQUET" (SNAPPY compressed)
+# Parquet shards are loaded with their column types instead of re-parsing text
+EXPORT_FORMAT = "CSV"
+EXPORT_FORMATS = {
+    # format: (compression, file suffix)
+    "CSV": ("GZIP", ".csv.gz"),
+    "PARQUET": ("SNAPPY", ".parquet"),
+}
+
+# Exported shards are downloaded from cloud storage in parallel
+DOWNLOAD_WORKERS = 8  # Number of concurrent shard (or slice) downloads
+DOWNLOAD_MAX_BYTES_IN_FLIGHT = 8 * 1024 * 1024 * 1024  # 8GB - downloading or waiting on disk
+DOWNLOAD_SLICE_SIZE = 256 * 1024 * 1024  # 256MB - larger shards are downloaded as ranges, None disables
+
+# Large query results are materialized and bulk exported when that is estimated to be faster
+# Route throughput estimates start from these values and are updated from measured runs.
+# The estimates are kept in the extract state store so that they carry over between runs.
+AUTO_ROUTE_QUERIES = True
+READ_ROUTE_BYTES_PER_SECOND = 20 * 1024 * 1024  # 20MB/s - list_rows or Storage API reads
+EXPORT_ROUTE_BYTES_PER_SECOND = 200 * 1024 * 1024  # 200MB/s - export, download and COPY
+EXPORT_ROUTE_OVERHEAD_SECONDS = 30  # Fixed cost of running an extract job
+ROUTE_THROUGHPUT_WEIGHT = 0.5  # Weight of the latest measurement in the running estimate
+ROUTE_STATE_NAME = "_query_routes"  # Extract state name recording the route estimates
+ROUTE_STATE_KEY = "bytes_per_second:{}"  # Extract state key for the estimate of each route
+STAGING_TABLE_EXPIRATION = 24 * 60 * 60  # Seconds before a materialized query table expires
+MATERIALIZE_TABLE_TYPES = ("VIEW", "MATERIALIZED_VIEW")  # Cannot be bulk exported directly
+
+# Standard SQL names for legacy SQL field types, used to cast incremental watermarks
+STANDARD_SQL_TYPES = {"INTEGER": "INT64", "FLOAT": "FLOAT64", "BOOLEAN": "BOOL"}
+
+# Partitioned export: each partition (table$YYYYMMDD) is exported and loaded as a unit
+PARTITION_EXPORT_WORKERS = 4  # Number of partition extract jobs run in parallel
+PARTITION_STATE_KEY = "last_partition:{}"  # Extract state key recording backfill progress per table
+
 
 class QuerySizeLimitError(Exception):
     pass
@@ -58,6 +117,9 @@ class BigQueryExtractor(BaseExtractor):
     - tableau_token_secret (string): PAT secret
     - tableau_username (string): Tableau username
     - tableau_password (string): Tableau password
+    - export_format (string): Bulk export format, "CSV" or "PARQUET" (default=EXPORT_FORMAT)
+    - staging_dataset (string): Dataset for tables materialized from queries ("project ID.dataset ID").
+        If None, query results are exported from the anonymous query results table
     NOTE: Authentication to Tableau Server can be either by Personal Access Token or
      Username and Password.  If both are specified then token takes precedence.
     """
@@ -72,7 +134,23 @@ class BigQueryExtractor(BaseExtractor):
         tableau_token_secret=None,
         tableau_username=None,
         tableau_password=None,
+        export_format=EXPORT_FORMAT,
+        staging_dataset=None,
     ):
+        export_format = export_format.upper()
+        if export_format not in EXPORT_FORMATS:
+            # Hyper has no Avro reader so AVRO exports cannot be loaded without re-encoding
+            raise ValueError(
+                "Unsupported export_format {}, must be one of {}".format(
+                    export_format, ", ".join(EXPORT_FORMATS)
+                )
+            )
+        self.export_format = export_format
+        self.staging_dataset = staging_dataset
+        self._route_bytes_per_second = {
+            "read": READ_ROUTE_BYTES_PER_SECOND,
+            "export": EXPORT_ROUTE_BYTES_PER_SECOND,
+        }
         super().__init__(
             tableau_hostname=tableau_hostname,
             tableau_project=tableau_project,
@@ -163,38 +241,443 @@ class BigQueryExtractor(BaseExtractor):
 
         return target_schema
 
-    def _query_to_hyper_files(self, sql_query, hyper_table_name="Extract"):
+    def _query_to_hyper_files(
+        self, sql_query, hyper_table_name="Extract", single_file=False
+    ):
         """
         Executes sql_query against the source database and writes the output to one or more Hyper files
-        Returns a list of output Hyper files
+        Returns an iterator of output Hyper files, each yielded once it is written
 
         sql_query -- SQL string to pass to the source database
         hyper_table_name -- Name of the target Hyper table, default=Extract
+        single_file -- Write the whole result to one Hyper file, default=False
         """
 
+        use_storage_api = USE_STORAGE_API and BigQueryReadClient is not None
+        max_query_size = (
+            STORAGE_API_MAX_QUERY_SIZE if use_storage_api else MAX_QUERY_SIZE
+        )
+
         # Dry run to estimate result size
         job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
         dryrun_query_job = bq_client.query(sql_query, job_config=job_config)
         dryrun_bytes_estimate = dryrun_query_job.total_bytes_processed
         logger.info("This query will process {} bytes.".format(dryrun_bytes_estimate))
 
-        if dryrun_bytes_estimate > MAX_QUERY_SIZE:
+        can_export = AUTO_ROUTE_QUERIES and bool(self.staging_bucket)
+        if dryrun_bytes_estimate > max_query_size and not can_export:
             raise QuerySizeLimitError(
-                "This query will return than {MAX_QUERY_SIZE} bytes"
+                f"This query will return more than {max_query_size} bytes"
             )
 
-        query_job = bq_client.query(sql_query)
+        query_temp_table, staging_table = self._materialize_query(
+            sql_query, use_staging_dataset=can_export
+        )
 
         # Determine table structure
-        query_temp_table = bq_client.get_table(query_job.destination)
         target_table_def = self._hyper_table_definition(
             query_temp_table, hyper_table_name
         )
 
-        def query_job_iter():
-            return bq_client.list_rows(query_job.destination)
+        route = "read"
+        if can_export:
+            # The dry run estimates bytes scanned, the materialized table is the result size
+            route = self._query_route(
+                query_temp_table.num_bytes,
+                force_export=query_temp_table.num_bytes > max_query_size,
+            )
+        if route == "export":
+            output_hyper_files = self._export_to_hyper_files(
+                self._table_id(query_temp_table),
+                target_table_def,
+                single_file=single_file,
+            )
+        else:
+
+            def query_job_iter():
+                if use_storage_api:
+                    return self._read_table_rows(query_temp_table, target_table_def)
+                return self._list_table_rows(query_temp_table, target_table_def)
+
+            # Storage API rows carry temporal and numeric values in Hyper-ready form
+            inserter_columns = None
+            if use_storage_api:
+                inserter_columns = arrow_inserter_columns(target_table_def)
+            if single_file:
+                output_hyper_files = self._query_result_to_hyper_files(
+                    query_job_iter,
+                    target_table_def,
+                    max_rows_per_file=None,
+                    max_bytes_per_file=None,
+                    inserter_columns=inserter_columns,
+                )
+            elif base_extractor.HYPER_WORKER_PROCESSES:
+
+                def worker_hyper_files():
+                    # Deferred so that the workers run while the route is being timed
+                    yield from self._query_result_to_hyper_files_in_workers(
+                        query_job_iter,
+                        target_table_def,
+                        workers=base_extractor.HYPER_WORKER_PROCESSES,
+                        inserter_columns=inserter_columns,
+                    )
+
+                output_hyper_files = worker_hyper_files()
+            else:
+                output_hyper_files = self._query_result_to_hyper_files(
+                    query_job_iter, target_table_def, inserter_columns=inserter_columns
+                )
+        return self._measure_route(
+            route, query_temp_table.num_bytes, output_hyper_files, staging_table
+        )
+
+    def _watermark_query(self, source_table, watermark_column, watermark=None):
+        """
+        Returns a query string that selects the rows of source_table whose watermark_column
+        is greater than watermark
+
+        source_table (string): Source table ref ("project ID.dataset ID.table ID")
+        watermark_column (string): Column that increases for new or changed rows
+        watermark (string): Last applied value of watermark_column as text, None selects all rows
+        """
+        sql_query = "SELECT * FROM `{}`".format(source_table)
+        if watermark is None:
+            return sql_query
+
+        source_table_ref = bq_client.get_table(source_table)
+        for source_field in source_table_ref.schema:
+            if source_field.name == watermark_column:
+                break
+        else:
+            raise ValueError(
+                "Watermark column {} not found in {}".format(
+                    watermark_column, source_table
+                )
+            )
+        field_type = STANDARD_SQL_TYPES.get(
+            source_field.field_type, source_field.field_type
+        )
+        watermark_literal = "'{}'".format(
+            str(watermark).replace("\\", "\\\\").replace("'", "\\'")
+        )
+        return "{} WHERE `{}` > CAST({} AS {})".format(
+            sql_query, watermark_column, watermark_literal, field_type
+        )
+
+    def _query_route(self, num_bytes, force_export=False):
+        """
+        Chooses how to fetch a query result of num_bytes: "read" (Storage API or list_rows)
+        or "export" (bulk export of the results table), whichever is estimated to be faster
+        from the measured throughput of previous queries
+
+        num_bytes (int): Size of the query results table
+        force_export (bool): The result is too large to read, always export
+        """
+        read_seconds = num_bytes / self._route_throughput("read")
+        export_seconds = (
+            EXPORT_ROUTE_OVERHEAD_SECONDS + num_bytes / self._route_throughput("export")
+        )
+        route = "export" if force_export or export_seconds < read_seconds else "read"
+        logger.info(
+            "Query result of {} bytes will be fetched by {} (estimated read {:.1f}s, export {:.1f}s)".format(
+                num_bytes, route, read_seconds, export_seconds
+            )
+        )
+        return route
+
+    def _route_throughput(self, route):
+        """
+        Returns the estimated bytes per second of route, as last recorded in the extract state
+        (by this or an earlier run), or the estimate held by this extractor
+
+        route (string): "read" or "export"
+        """
+        try:
+            self._route_bytes_per_second[route] = self._get_extract_state(
+                ROUTE_STATE_NAME,
+                ROUTE_STATE_KEY.format(route),
+                self._route_bytes_per_second[route],
+            )
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read route throughput estimate: {}".format(e))
+        return self._route_bytes_per_second[route]
+
+    def _measure_route(self, route, num_bytes, output_hyper_files, staging_table=None):
+        """
+        Yields from output_hyper_files, timing how long they take to produce, then updates the
+        throughput estimate for route and drops staging_table
+
+        route (string): "read" or "export"
+        num_bytes (int): Size of the query results table
+        output_hyper_files (iterable): Hyper files produced by route
+        staging_table (string): Materialized query table to drop once done (default=None)
+        """
+        output_hyper_files = iter(output_hyper_files)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.monotonic()
+                path_to_database = next(output_hyper_files, None)
+                elapsed += time.monotonic() - started
+                if path_to_database is None:
+                    break
+                yield path_to_database
+
+            if route == "export":
+                elapsed -= EXPORT_ROUTE_OVERHEAD_SECONDS
+            if num_bytes and elapsed > 0:
+                self._route_bytes_per_second[route] = (
+                    ROUTE_THROUGHPUT_WEIGHT * num_bytes / elapsed
+                    + (1 - ROUTE_THROUGHPUT_WEIGHT) * self._route_throughput(route)
+                )
+                logger.info(
+                    "Measured {} bytes/s for {} route, estimate is now {:.0f} bytes/s".format(
+                        int(num_bytes / elapsed), route, self._route_bytes_per_second[route]
+                    )
+                )
+                try:
+                    self._set_extract_state(
+                        ROUTE_STATE_NAME,
+                        ROUTE_STATE_KEY.format(route),
+                        self._route_bytes_per_second[route],
+                    )
+                except OSError as e:
+                    logger.warning(
+                        "Could not record route throughput estimate: {}".format(e)
+                    )
+        finally:
+            if hasattr(output_hyper_files, "close"):
+                output_hyper_files.close()
+            self._drop_staging_table(staging_table)
+
+    def _table_id(self, table):
+        """
+        Returns the table ref string ("project ID.dataset ID.table ID") for a Table
+        """
+        return "{}.{}.{}".format(table.project, table.dataset_id, table.table_id)
+
+    def _materialize_query(self, sql_query, use_staging_dataset=True):
+        """
+        Runs sql_query and waits for the result to be written to a table
+        Returns a tuple of (Table, staging_table) where staging_table is the ref of the table
+        created in staging_dataset, to be dropped with _drop_staging_table once exported, or None
+        if the result was written to the anonymous query results table (expires after 24h)
+
+        sql_query (string): SQL string to pass to the source database
+        use_staging_dataset (bool): Write the result to staging_dataset if set (default=True)
+        """
+        job_config = bigquery.QueryJobConfig()
+        staging_table = None
+        if use_staging_dataset and self.staging_dataset:
+            staging_table = "{}.tableau_extract_{}".format(
+                self.staging_dataset, uuid.uuid4().hex
+            )
+            job_config.destination = staging_table
+        query_job = bq_client.query(sql_query, job_config=job_config)
+        query_job.result()  # Waits for query to complete.
+
+        query_temp_table = bq_client.get_table(query_job.destination)
+        if staging_table is not None:
+            # Expire the materialized table in case it is not dropped
+            query_temp_table.expires = datetime.now(timezone.utc) + timedelta(
+                seconds=STAGING_TABLE_EXPIRATION
+            )
+            query_temp_table = bq_client.update_table(query_temp_table, ["expires"])
+        return query_temp_table, staging_table
+
+    def _drop_staging_table(self, staging_table):
+        """
+        Drops a table created by _materialize_query, does nothing if staging_table is None
+        """
+        if staging_table is not None:
+            bq_client.delete_table(staging_table, not_found_ok=True)
+            logger.info("Dropped staging table {}".format(staging_table))
+
+    def _export_source_table(self, source_table, columns=None, where=None):
+        """
+        Pushes the columns projection and where filter for a bulk export of source_table down
+        into BigQuery by materializing the selected rows and columns to a table.  Views
+        (MATERIALIZE_TABLE_TYPES) are always materialized as extract jobs only read tables.
+        Returns a tuple of (table ref to export, Table, staging_table), where staging_table is
+        the materialized table to drop with _drop_staging_table, or None
+
+        source_table (string): Source table ref ("project ID.dataset ID.table ID")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
+        """
+        source_table_ref = bq_client.get_table(source_table)
+        is_view = source_table_ref.table_type in MATERIALIZE_TABLE_TYPES
+        if columns is None and where is None and not is_view:
+            return source_table, source_table_ref, None
+
+        sql_query = "SELECT {} FROM `{}`".format(
+            ", ".join("`{}`".format(column) for column in columns)
+            if columns
+            else "*",
+            source_table,
+        )
+        if where is not None:
+            sql_query += " WHERE {}".format(where)
+        logger.info("Materializing {} for export".format(sql_query))
+        query_temp_table, staging_table = self._materialize_query(sql_query)
+        return self._table_id(query_temp_table), query_temp_table, staging_table
+
+    def _source_table_to_hyper_files(
+        self,
+        source_table,
+        hyper_table_name="Extract",
+        columns=None,
+        where=None,
+        single_file=False,
+    ):
+        """
+        Bulk exports the selected columns and rows of source_table and yields Hyper files
+        built from the exported shards, in export order
+        The caller is responsible for removing each file.
+
+        source_table (string): Source table ref ("project ID.dataset ID.table ID")
+        hyper_table_name (string): Name of the target Hyper table (default="Extract")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
+        single_file (bool): Merge the export into one Hyper file (default=False)
+        """
+        source_table, source_table_ref, staging_table = self._export_source_table(
+            source_table, columns, where
+        )
+        try:
+            target_table_def = self._hyper_table_definition(
+                source_table_ref, hyper_table_name=hyper_table_name
+            )
+            yield from self._export_to_hyper_files(
+                source_table, target_table_def, single_file=single_file
+            )
+        finally:
+            self._drop_staging_table(staging_table)
+
+    def _list_table_rows(self, source_table, target_table_def):
+        """
+        Reads all rows of source_table with tabledata.list (list_rows)
+        Returns a generator of row tuples in table order
+
+        The table is split into LIST_ROWS_PAGE_SIZE row ranges by start_index and up to
+        LIST_ROWS_WORKERS ranges are fetched in parallel, holding at most
+        LIST_ROWS_PREFETCH_PAGES pages in memory.  Only the columns in target_table_def
+        are requested.
+
+        source_table (obj): Source table (Instance of google.cloud.bigquery.table.Table)
+        target_table_def (TableDefinition): Schema for target extract table
+        """
+        target_columns = {column.name.unescaped for column in target_table_def.columns}
+        selected_fields = [
+            field for field in source_table.schema if field.name in target_columns
+        ]
+
+        def fetch_page(start_index):
+            return [
+                tuple(row)
+                for row in bq_client.list_rows(
+                    source_table,
+                    selected_fields=selected_fields,
+                    start_index=start_index,
+                    max_results=LIST_ROWS_PAGE_SIZE,
+                    page_size=LIST_ROWS_PAGE_SIZE,
+                )
+            ]
+
+        start_indexes = iter(range(0, source_table.num_rows, LIST_ROWS_PAGE_SIZE))
+        pages = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=LIST_ROWS_WORKERS, thread_name_prefix="list_rows"
+        ) as executor:
+            try:
+                for start_index in itertools.islice(
+                    start_indexes, LIST_ROWS_PREFETCH_PAGES
+                ):
+                    pages.append(executor.submit(fetch_page, start_index))
+                while pages:
+                    rows = pages.popleft().result()
+                    # Refill the window before handing the page to the writer
+                    for start_index in itertools.islice(start_indexes, 1):
+                        pages.append(executor.submit(fetch_page, start_index))
+                    yield from rows
+            finally:
+                for page in pages:
+                    page.cancel()
+
+    def _read_table_rows(self, source_table, target_table_def):
+        """
+        Reads all rows of source_table with the BigQuery Storage Read API
+        Returns a generator of row tuples in schema column order, converted with
+        arrow_batch_rows for an Inserter created with arrow_inserter_columns
+
+        Arrow record batches are read from up to STORAGE_API_MAX_STREAMS streams in
+        parallel by background threads and converted to rows as they arrive, so rows
+        are not returned in table order.
+
+        source_table (obj): Source table (Instance of google.cloud.bigquery.table.Table)
+        target_table_def (TableDefinition): Schema for target extract table
+        """
+        read_client = BigQueryReadClient()
+        requested_session = bqstorage_types.ReadSession(
+            table="projects/{}/datasets/{}/tables/{}".format(
+                source_table.project, source_table.dataset_id, source_table.table_id
+            ),
+            data_format=bqstorage_types.DataFormat.ARROW,
+        )
+        read_session = read_client.create_read_session(
+            parent="projects/{}".format(bq_client.project),
+            read_session=requested_session,
+            max_stream_count=STORAGE_API_MAX_STREAMS,
+        )
+        logger.info(
+            "Reading {} with {} Storage API streams".format(
+                source_table.reference, len(read_session.streams)
+            )
+        )
+
+        record_batches = queue.Queue(maxsize=STORAGE_API_QUEUE_SIZE)
+        stop_reading = threading.Event()
+
+        def put_batch(item):
+            while not stop_reading.is_set():
+                try:
+                    record_batches.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    pass
+
+        def read_stream(stream):
+            try:
+                reader = read_client.read_rows(stream.name)
+                for page in reader.rows(read_session).pages:
+                    if stop_reading.is_set():
+                        return
+                    put_batch(page.to_arrow())
+            except Exception as e:
+                put_batch(e)
+            finally:
+                put_batch(None)
 
-        return self._query_result_to_hyper_files(query_job_iter, target_table_def)
+        reader_threads = [
+            threading.Thread(target=read_stream, args=(stream,), daemon=True)
+            for stream in read_session.streams
+        ]
+        for reader_thread in reader_threads:
+            reader_thread.start()
+        try:
+            streams_remaining = len(reader_threads)
+            while streams_remaining:
+                record_batch = record_batches.get()
+                if record_batch is None:
+                    streams_remaining -= 1
+                    continue
+                if isinstance(record_batch, Exception):
+                    raise record_batch
+                yield from arrow_batch_rows(record_batch, target_table_def)
+        finally:
+            stop_reading.set()
 
     def load_sample(
         self,
@@ -216,29 +699,39 @@ class BigQueryExtractor(BaseExtractor):
         # set publish_mode=TSC.Server.PublishMode.Overwrite to refresh a sample
         sql_query = "SELECT * FROM `{}` LIMIT {}".format(source_table, sample_rows)
         output_hyper_files = self._query_to_hyper_files(sql_query, tab_ds_name)
+        # The sample table is named after the datasource, so later chunks insert into it
+        insert_actions_json = [
+            self._changeset_action_json(
+                action="INSERT",
+                changeset_table_name=tab_ds_name,
+                target_table_name=tab_ds_name,
+            )
+        ]
         first_chunk = True
         for path_to_database in output_hyper_files:
-            if first_chunk:
-                self._publish_hyper_file(path_to_database, tab_ds_name, publish_mode)
-                first_chunk = False
-            else:
-                self._update_datasource_from_hyper_file(
-                    path_to_database=path_to_database,
-                    tab_ds_name=tab_ds_name,
-                    action="INSERT",
-                )
-            self._publish_hyper_file(path_to_database, tab_ds_name, publish_mode)
-            os.remove(path_to_database)
+            try:
+                if first_chunk:
+                    self._publish_hyper_file(
+                        path_to_database, tab_ds_name, publish_mode
+                    )
+                    first_chunk = False
+                else:
+                    self._patch_datasource(
+                        path_to_database, tab_ds_name, insert_actions_json
+                    )
+            finally:
+                os.remove(path_to_database)
 
     def _extract_to_blobs(self, source_table):
         # Returns list of blobs
         # 1: EXTRACT
+        compression, file_suffix = EXPORT_FORMATS[self.export_format]
         extract_job_config = bigquery.ExtractJobConfig(
-            compression="GZIP", destination_format="CSV"
+            compression=compression, destination_format=self.export_format
         )
         extract_prefix = "staging/{}_{}".format(source_table, uuid.uuid4().hex)
-        extract_destination_uri = "gs://{}/{}-*.csv.gz".format(
-            self.staging_bucket, extract_prefix
+        extract_destination_uri = "gs://{}/{}-*{}".format(
+            self.staging_bucket, extract_prefix, file_suffix
         )
         extract_job = bq_client.extract_table(
             source_table, extract_destination_uri, job_config=extract_job_config
@@ -253,12 +746,198 @@ class BigQueryExtractor(BaseExtractor):
 
     def _download_blob(self, blob, local_filename):
         logger.info("Downloading blob:{}".format(blob))
-        # # TODO: better error checking here
-        blob.download_to_filename("{}.gz".format(local_filename))
-        subprocess.run(["gunzip", "{}.gz".format(local_filename)], check=True)
+        blob.download_to_filename(local_filename, raw_download=True)
+
+    def _download_blob_range(self, blob, local_filename, start, end):
+        logger.debug("Downloading bytes {}-{} of blob:{}".format(start, end, blob))
+        with open(local_filename, "r+b") as local_file:
+            local_file.seek(start)
+            blob.download_to_file(local_file, start=start, end=end, raw_download=True)
+
+    def _submit_blob_download(self, executor, blob, local_filename):
+        """
+        Submits the download of blob to executor
+        Returns a list of futures, one per range for blobs larger than DOWNLOAD_SLICE_SIZE
+
+        executor (Executor): Download thread pool
+        blob (obj): Exported shard (Instance of google.cloud.storage.blob.Blob)
+        local_filename (string): Local file to download to
+        """
+        if DOWNLOAD_SLICE_SIZE is None or not blob.size or blob.size <= DOWNLOAD_SLICE_SIZE:
+            return [executor.submit(self._download_blob, blob, local_filename)]
+
+        logger.info(
+            "Downloading blob:{} in {} byte ranges".format(blob, DOWNLOAD_SLICE_SIZE)
+        )
+        # Allocate the whole file so that each range can be written in place
+        with open(local_filename, "wb") as local_file:
+            local_file.truncate(blob.size)
+        return [
+            executor.submit(
+                self._download_blob_range,
+                blob,
+                local_filename,
+                start,
+                min(start + DOWNLOAD_SLICE_SIZE, blob.size) - 1,
+            )
+            for start in range(0, blob.size, DOWNLOAD_SLICE_SIZE)
+        ]
+
+    def _download_blobs(self, blobs):
+        """
+        Downloads blobs with a pool of DOWNLOAD_WORKERS threads, keeping at most
+        DOWNLOAD_MAX_BYTES_IN_FLIGHT bytes downloading or downloaded but not yet consumed
+        Yields the local filename of each blob in the order of blobs, the caller is
+        responsible for removing each file
+
+        blobs (iterable): Exported shards (Instances of google.cloud.storage.blob.Blob)
+        """
+        compression, file_suffix = EXPORT_FORMATS[self.export_format]
+        blobs = iter(blobs)
+        next_blob = next(blobs, None)
+        pending = collections.deque()  # (local_filename, size, futures) in blob order
+        bytes_in_flight = 0
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=DOWNLOAD_WORKERS, thread_name_prefix="blob_download"
+        ) as executor:
+            try:
+                while next_blob is not None or pending:
+                    # Always allow one download so that a blob larger than the limit can proceed
+                    while next_blob is not None and (
+                        not pending
+                        or DOWNLOAD_MAX_BYTES_IN_FLIGHT is None
+                        or bytes_in_flight + (next_blob.size or 0)
+                        <= DOWNLOAD_MAX_BYTES_IN_FLIGHT
+                    ):
+                        local_filename = tempfile_name(prefix="temp", suffix=file_suffix)
+                        pending.append(
+                            (
+                                local_filename,
+                                next_blob.size or 0,
+                                self._submit_blob_download(
+                                    executor, next_blob, local_filename
+                                ),
+                            )
+                        )
+                        bytes_in_flight += next_blob.size or 0
+                        next_blob = next(blobs, None)
+
+                    local_filename, size, futures = pending[0]
+                    for future in futures:
+                        future.result()
+                    pending.popleft()
+                    yield local_filename
+                    bytes_in_flight -= size
+            finally:
+                # Abandoned or failed: stop queued downloads and remove partial files
+                for local_filename, size, futures in pending:
+                    for future in futures:
+                        future.cancel()
+                    concurrent.futures.wait(futures)
+                    if os.path.exists(local_filename):
+                        os.remove(local_filename)
+
+    def _shard_to_hyper_files(self, path_to_shard, target_table_def):
+        """
+        Writes a downloaded export shard to one or more Hyper files and removes the shard
+        Returns a list of output Hyper files
+
+        path_to_shard (string): Local copy of an exported shard
+        target_table_def (TableDefinition): Schema for target extract table
+        """
+        # Shards are loaded as downloaded: Hyper reads the gzip compressed CSV directly
+        try:
+            if self.export_format == "PARQUET":
+                return self._parquet_to_hyper_files(path_to_shard, target_table_def)
+            return self._csv_to_hyper_files(path_to_shard, target_table_def)
+        finally:
+            os.remove(path_to_shard)
+
+    def _shards_to_hyper_file(self, shards, target_table_def):
+        """
+        Loads downloaded export shards into a single Hyper file as they arrive, removing each
+        shard once it is loaded
+        Returns the path of the Hyper file
+
+        shards (iterable): Local copies of the exported shards
+        target_table_def (TableDefinition): Schema for target extract table
+        """
+        if base_extractor.HYPER_WORKER_PROCESSES:
+            hyper_files = list(
+                self._files_to_hyper_files_in_workers(
+                    shards,
+                    target_table_def,
+                    file_format=self.export_format,
+                    workers=base_extractor.HYPER_WORKER_PROCESSES,
+                    merge=True,
+                )
+            )
+            if hyper_files:
+                (path_to_database,) = hyper_files
+                return path_to_database
+            # No shards (e.g. an empty table or partition): write an empty extract table
+            shards = []
+        return self._merge_files_to_hyper_file(
+            shards, target_table_def, file_format=self.export_format
+        )
+
+    def _export_to_hyper_files(self, source_table, target_table_def, single_file=False):
+        """
+        Bulk exports source_table and yields Hyper files built from the exported shards, in
+        export order.  Later shards download in parallel while earlier ones are converted.
+        The caller is responsible for removing each file.
+
+        source_table (string): Source table ref ("project ID.dataset ID.table ID")
+        target_table_def (TableDefinition): Schema for target extract table
+        single_file (bool): Merge the export into one Hyper file (default=False)
+        """
+        yield from self._blobs_to_hyper_files(
+            self._extract_to_blobs(source_table), target_table_def, single_file
+        )
+
+    def _blobs_to_hyper_files(self, blobs, target_table_def, single_file=False):
+        """
+        Downloads exported blobs and yields Hyper files built from them, in export order
+        The caller is responsible for removing each file.
+
+        blobs (iterable): Exported shards (Instances of google.cloud.storage.blob.Blob)
+        target_table_def (TableDefinition): Schema for target extract table
+        single_file (bool): Merge the shards into one Hyper file (default=False)
+        """
+        shards = self._download_blobs(blobs)
+        if single_file:
+            yield self._shards_to_hyper_file(shards, target_table_def)
+            return
+        if base_extractor.HYPER_WORKER_PROCESSES:
+            # Shards are converted in parallel by worker processes, one Hyper file each
+            yield from self._files_to_hyper_files_in_workers(
+                shards,
+                target_table_def,
+                file_format=self.export_format,
+                workers=base_extractor.HYPER_WORKER_PROCESSES,
+                merge=False,
+            )
+            return
+        for path_to_shard in shards:
+            output_hyper_files = self._shard_to_hyper_files(
+                path_to_shard, target_table_def
+            )
+            try:
+                while output_hyper_files:
+                    yield output_hyper_files.pop(0)
+            finally:
+                for path_to_database in output_hyper_files:
+                    os.remove(path_to_database)
 
     def export_load(
-        self, source_table, tab_ds_name, publish_mode=TSC.Server.PublishMode.CreateNew
+        self,
+        source_table,
+        tab_ds_name,
+        publish_mode=TSC.Server.PublishMode.CreateNew,
+        single_file=None,
+        partitioned=False,
+        columns=None,
+        where=None,
     ):
         """
         Bulk export the contents of source_table and load to a Tableau Server
@@ -266,31 +945,224 @@ class BigQueryExtractor(BaseExtractor):
         source_table (string): Source table ref ("project ID.dataset ID.table ID")
         tab_ds_name (string): Target datasource name
         publish_mode: One of TSC.Server.[Overwrite|CreateNew] (default=CreateNew)
+        single_file (bool): Merge the export into one Hyper file and publish it once
+            (default=EXPORT_LOAD_SINGLE_FILE)
+        partitioned (bool): Export each partition of a time partitioned source_table
+            (table$YYYYMMDD) as an independent unit with parallel extract jobs.  The first
+            partition is published and the rest are appended, so single_file is ignored.
+            Progress is recorded so backfill_partitions can resume an interrupted load.
+            (default=False)
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
         """
+        if single_file is None:
+            single_file = base_extractor.EXPORT_LOAD_SINGLE_FILE
+        if partitioned:
+            if columns is not None or where is not None:
+                raise ValueError(
+                    "columns and where are not supported with partitioned=True"
+                )
+            self._load_partitions(
+                source_table,
+                self._table_partitions(source_table),
+                tab_ds_name,
+                publish_mode,
+            )
+            return
+
         # Uses the bigquery export api to split large table to csv for load
-        source_table_ref = bq_client.get_table(source_table)
-        target_table_def = self._hyper_table_definition(source_table_ref)
-        first_chunk = True
-        for blob in self._extract_to_blobs(source_table):
-            temp_csv_filename = tempfile_name(prefix="temp", suffix=".csv")
-            self._download_blob(blob, temp_csv_filename)
-            output_hyper_files = self._csv_to_hyper_files(
-                temp_csv_filename, target_table_def
+        source_table, source_table_ref, staging_table = self._export_source_table(
+            source_table, columns, where
+        )
+        try:
+            target_table_def = self._hyper_table_definition(source_table_ref)
+            if single_file:
+                # One publish job for the whole table: shards are loaded as they download
+                path_to_database = self._shards_to_hyper_file(
+                    self._download_blobs(self._extract_to_blobs(source_table)),
+                    target_table_def,
+                )
+                try:
+                    self._publish_hyper_file(path_to_database, tab_ds_name, publish_mode)
+                finally:
+                    os.remove(path_to_database)
+                return
+
+            self._load_hyper_files(
+                self._export_to_hyper_files(source_table, target_table_def),
+                tab_ds_name,
+                target_table_def,
+                publish_mode,
             )
-            for path_to_database in output_hyper_files:
-                if first_chunk:
+        finally:
+            self._drop_staging_table(staging_table)
+
+    def _load_hyper_files(
+        self, output_hyper_files, tab_ds_name, target_table_def, publish_mode=None
+    ):
+        """
+        Loads Hyper files to a datasource on Tableau Server and removes them
+        The first file is published with publish_mode and the rest are appended with one PATCH
+        job each.  If publish_mode is None every file is appended to the existing datasource.
+
+        output_hyper_files (iterator): Hyper files to load, e.g. from _export_to_hyper_files
+        tab_ds_name (string): Target datasource name
+        target_table_def (TableDefinition): Schema of the extract table in each file
+        publish_mode: One of TSC.Server.[Overwrite|CreateNew], or None to append
+        """
+        output_hyper_files = iter(output_hyper_files)
+        try:
+            if publish_mode is not None:
+                # Publish the first file, then append the rest while later shards download
+                path_to_database = next(output_hyper_files)
+                try:
                     self._publish_hyper_file(
                         path_to_database, tab_ds_name, publish_mode
                     )
-                    first_chunk = False
-                else:
-                    self._update_datasource_from_hyper_file(
-                        path_to_database=path_to_database,
-                        tab_ds_name=tab_ds_name,
-                        action="INSERT",
+                finally:
+                    os.remove(path_to_database)
+            insert_actions_json = [
+                self._changeset_action_json(
+                    action="INSERT",
+                    changeset_table_name=target_table_def.table_name.name.unescaped,
+                )
+            ]
+            self._patch_datasource_from_hyper_files(
+                output_hyper_files, tab_ds_name, lambda path: insert_actions_json
+            )
+        finally:
+            if hasattr(output_hyper_files, "close"):
+                output_hyper_files.close()
+
+    def _table_partitions(self, source_table, start_partition=None, end_partition=None):
+        """
+        Returns the partition IDs of a time partitioned table in ascending order
+        Special partitions (__NULL__, __UNPARTITIONED__) sort after dated partitions
+
+        source_table (string): Source table ref ("project ID.dataset ID.table ID")
+        start_partition (string): First partition to include, e.g. "20200101" or "2020-01-01"
+            (default=first partition)
+        end_partition (string): Last partition to include (default=last partition)
+        """
+        source_table_ref = bq_client.get_table(source_table)
+        if source_table_ref.time_partitioning is None:
+            raise ValueError(
+                "Table {} is not time partitioned".format(source_table)
+            )
+        if source_table_ref.table_type in MATERIALIZE_TABLE_TYPES:
+            raise ValueError(
+                "Partitions of {} {} cannot be exported".format(
+                    source_table_ref.table_type, source_table
+                )
+            )
+        partitions = sorted(bq_client.list_partitions(source_table_ref))
+        if start_partition is not None:
+            start_partition = str(start_partition).replace("-", "")
+            partitions = [p for p in partitions if p >= start_partition]
+        if end_partition is not None:
+            end_partition = str(end_partition).replace("-", "")
+            partitions = [p for p in partitions if p <= end_partition]
+        return partitions
+
+    def _load_partitions(
+        self, source_table, partitions, tab_ds_name, publish_mode=None
+    ):
+        """
+        Bulk exports each partition of source_table and loads it to a datasource on Tableau Server
+        Up to PARTITION_EXPORT_WORKERS extract jobs run in parallel ahead of the partition being
+        loaded.  Each partition is merged into its own Hyper file and applied with one publish or
+        PATCH job, so it is loaded in full or not at all, and the partition ID is recorded in the
+        extract state once that job has finished.
+
+        source_table (string): Source table ref ("project ID.dataset ID.table ID")
+        partitions (list): Partition IDs to load, in order
+        tab_ds_name (string): Target datasource name
+        publish_mode: One of TSC.Server.[Overwrite|CreateNew] for the first partition, or None
+            to append every partition to the existing datasource
+        """
+        source_table_ref = bq_client.get_table(source_table)
+        target_table_def = self._hyper_table_definition(source_table_ref)
+        state_key = PARTITION_STATE_KEY.format(source_table)
+        if publish_mode is not None:
+            # A new datasource starts with no partitions loaded
+            self._set_extract_state(tab_ds_name, state_key, None)
+        partitions = iter(partitions)
+        extract_jobs = collections.deque()
+
+        def submit_extract(executor, partition_id):
+            partition_table = "{}${}".format(source_table, partition_id)
+            extract_jobs.append(
+                (partition_id, executor.submit(self._extract_to_blobs, partition_table))
+            )
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=PARTITION_EXPORT_WORKERS, thread_name_prefix="extract"
+        ) as executor:
+            try:
+                for partition_id in itertools.islice(
+                    partitions, PARTITION_EXPORT_WORKERS
+                ):
+                    submit_extract(executor, partition_id)
+                while extract_jobs:
+                    partition_id, extract_job = extract_jobs.popleft()
+                    blobs = extract_job.result()
+                    for next_partition_id in itertools.islice(partitions, 1):
+                        submit_extract(executor, next_partition_id)
+                    self._load_hyper_files(
+                        self._blobs_to_hyper_files(
+                            blobs, target_table_def, single_file=True
+                        ),
+                        tab_ds_name,
+                        target_table_def,
+                        publish_mode,
                     )
-                os.remove(path_to_database)
-            os.remove(Path(temp_csv_filename))
+                    publish_mode = None
+                    self._set_extract_state(tab_ds_name, state_key, partition_id)
+                    logger.info(
+                        "Loaded partition {} of {} to {}".format(
+                            partition_id, source_table, tab_ds_name
+                        )
+                    )
+            finally:
+                for partition_id, extract_job in extract_jobs:
+                    extract_job.cancel()
+
+    def backfill_partitions(
+        self,
+        source_table,
+        tab_ds_name,
+        start_partition=None,
+        end_partition=None,
+        resume=True,
+    ):
+        """
+        Appends the partitions of source_table from start_partition to end_partition to an
+        existing datasource on Tableau Server, one partition at a time in ascending order
+
+        source_table (string): Source table ref ("project ID.dataset ID.table ID")
+        tab_ds_name (string): Target datasource name
+        start_partition (string): First partition to load, e.g. "20200101" or "2020-01-01"
+            (default=first partition)
+        end_partition (string): Last partition to load (default=last partition)
+        resume (bool): Skip partitions up to the last one recorded as loaded by a previous
+            export_load or backfill into this datasource (default=True)
+        """
+        partitions = self._table_partitions(
+            source_table, start_partition, end_partition
+        )
+        if resume:
+            last_partition = self._get_extract_state(
+                tab_ds_name, PARTITION_STATE_KEY.format(source_table)
+            )
+            if last_partition is not None:
+                logger.info(
+                    "Resuming backfill of {} after partition {}".format(
+                        source_table, last_partition
+                    )
+                )
+                partitions = [p for p in partitions if p > last_partition]
+        self._load_partitions(source_table, partitions, tab_ds_name)
 
     def append_to_datasource(
         self,
@@ -298,6 +1170,8 @@ class BigQueryExtractor(BaseExtractor):
         sql_query=None,
         source_table=None,
         changeset_table_name="new_rows",
+        columns=None,
+        where=None,
     ):
         """
         Appends the result of sql_query to a datasource on Tableau Server
@@ -307,6 +1181,9 @@ class BigQueryExtractor(BaseExtractor):
         source_table (string): Identifier for source table containing the changeset
         changeset_table_name (string): The name of the table in the hyper file that
             contains the changeset (default="new_rows")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
 
         NOTES:
         - Specify either sql_query OR source_table, error if both specified
@@ -314,41 +1191,24 @@ class BigQueryExtractor(BaseExtractor):
 
         if not (bool(sql_query) ^ bool(source_table)):
             raise Exception("Must specify either sql_query OR source_table")
+        actions_json = [
+            self._changeset_action_json(
+                action="INSERT", changeset_table_name=changeset_table_name
+            )
+        ]
         if sql_query:
             # Execute query to generate append changeset - slower than bulk extract
             output_hyper_files = self._query_to_hyper_files(
                 sql_query, changeset_table_name
             )
-
-            for path_to_database in output_hyper_files:
-                self._update_datasource_from_hyper_file(
-                    path_to_database=path_to_database,
-                    tab_ds_name=tab_ds_name,
-                    changeset_table_name=changeset_table_name,
-                    action="INSERT",
-                )
-                os.remove(path_to_database)
         if source_table:
             # Bulk extract and append from a changeset that is stored in a bq table
-            source_table_ref = bq_client.get_table(source_table)
-            target_table_def = self._hyper_table_definition(
-                source_table_ref, hyper_table_name=changeset_table_name
+            output_hyper_files = self._source_table_to_hyper_files(
+                source_table, changeset_table_name, columns, where
             )
-            for blob in self._extract_to_blobs(source_table):
-                temp_csv_filename = tempfile_name(prefix="temp", suffix=".csv")
-                self._download_blob(blob, temp_csv_filename)
-                output_hyper_files = self._csv_to_hyper_files(
-                    temp_csv_filename, target_table_def
-                )
-                for path_to_database in output_hyper_files:
-                    self._update_datasource_from_hyper_file(
-                        path_to_database=path_to_database,
-                        tab_ds_name=tab_ds_name,
-                        changeset_table_name=changeset_table_name,
-                        action="INSERT",
-                    )
-                    os.remove(path_to_database)
-                os.remove(Path(temp_csv_filename))
+        self._patch_datasource_from_hyper_files(
+            output_hyper_files, tab_ds_name, lambda path: actions_json
+        )
 
     def update_datasource(
         self,
@@ -358,6 +1218,8 @@ class BigQueryExtractor(BaseExtractor):
         match_columns=None,
         match_conditions_json=None,
         changeset_table_name="updated_rows",
+        columns=None,
+        where=None,
     ):
         """
         Updates a datasource on Tableau Server with the changeset from sql_query
@@ -370,6 +1232,9 @@ class BigQueryExtractor(BaseExtractor):
             See Hyper API guide for details.
         changeset_table_name (string): The name of the table in the hyper file that contains
             the changeset (default="updated_rows")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
 
         NOTES:
         - Specify either match_columns OR match_conditions_json, error if both specified
@@ -382,42 +1247,86 @@ class BigQueryExtractor(BaseExtractor):
         if not ((sql_query is None) ^ (source_table is None)):
             raise Exception("Must specify either sql_query OR source_table")
 
+        actions_json = [
+            self._changeset_action_json(
+                action="UPDATE",
+                match_columns=match_columns,
+                match_conditions_json=match_conditions_json,
+                changeset_table_name=changeset_table_name,
+            )
+        ]
         if sql_query:
             # Execute query to generate update changeset - slower than bulk extract
             output_hyper_files = self._query_to_hyper_files(
                 sql_query, changeset_table_name
             )
-            for path_to_database in output_hyper_files:
-                self._update_datasource_from_hyper_file(
-                    path_to_database,
-                    tab_ds_name,
-                    match_columns,
-                    match_conditions_json,
-                    changeset_table_name,
-                )
-                os.remove(path_to_database)
         if source_table:
             # Bulk extract and update from a changeset that is stored in a bq table
-            source_table_ref = bq_client.get_table(source_table)
-            target_table_def = self._hyper_table_definition(
-                source_table_ref, hyper_table_name=changeset_table_name
+            output_hyper_files = self._source_table_to_hyper_files(
+                source_table, changeset_table_name, columns, where
             )
-            for blob in self._extract_to_blobs(source_table):
-                temp_csv_filename = tempfile_name(prefix="temp", suffix=".csv")
-                self._download_blob(blob, temp_csv_filename)
-                output_hyper_files = self._csv_to_hyper_files(
-                    temp_csv_filename, target_table_def
-                )
-                for path_to_database in output_hyper_files:
-                    self._update_datasource_from_hyper_file(
-                        path_to_database,
-                        tab_ds_name,
-                        match_columns,
-                        match_conditions_json,
-                        changeset_table_name,
-                    )
-                    os.remove(path_to_database)
-                os.remove(Path(temp_csv_filename))
+        self._patch_datasource_from_hyper_files(
+            output_hyper_files, tab_ds_name, lambda path: actions_json
+        )
+
+    def upsert_to_datasource(
+        self,
+        tab_ds_name,
+        sql_query=None,
+        source_table=None,
+        match_columns=None,
+        match_conditions_json=None,
+        changeset_table_name="upserted_rows",
+        columns=None,
+        where=None,
+    ):
+        """
+        Upsert/Merge the changeset from sql_query into a datasource on Tableau Server
+        Rows matching the changeset keys are deleted and the changeset is inserted in a
+        single transaction
+
+        tab_ds_name (string): Target datasource name
+        sql_query (string): The query string that generates the changeset
+        source_table (string): Identifier for source table containing the changeset
+        match_columns (array of tuples): Array of (source_col, target_col) pairs
+        match_conditions_json (string): Define conditions for matching rows in json format.
+            See Hyper API guide for details.
+        changeset_table_name (string): The name of the table in the hyper file that contains
+            the changeset (default="upserted_rows")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
+
+        NOTES:
+        - Specify either match_columns OR match_conditions_json, error if both specified
+        - Specify either sql_query OR source_table, error if both specified
+        """
+        if not ((match_columns is None) ^ (match_conditions_json is None)):
+            raise Exception(
+                "Must specify either match_columns OR match_conditions_json"
+            )
+        if not ((sql_query is None) ^ (source_table is None)):
+            raise Exception("Must specify either sql_query OR source_table")
+
+        if sql_query:
+            # Execute query to generate upsert changeset - slower than bulk extract
+            output_hyper_files = self._query_to_hyper_files(
+                sql_query, changeset_table_name, single_file=True
+            )
+        if source_table:
+            # Bulk extract and upsert from a changeset that is stored in a bq table
+            output_hyper_files = self._source_table_to_hyper_files(
+                source_table, changeset_table_name, columns, where, single_file=True
+            )
+        # The changeset is written to one file so that it is applied in one transaction:
+        # split files would each delete rows inserted by earlier files for the same keys
+        self._patch_datasource_from_hyper_files(
+            output_hyper_files,
+            tab_ds_name,
+            lambda path: self._upsert_actions_json(
+                path, match_columns, match_conditions_json, changeset_table_name
+            ),
+        )
 
     def delete_from_datasource(
         self,
@@ -427,6 +1336,8 @@ class BigQueryExtractor(BaseExtractor):
         match_columns=None,
         match_conditions_json=None,
         changeset_table_name="deleted_rowids",
+        columns=None,
+        where=None,
     ):
         """
         Delete rows matching the changeset from sql_query from a datasource on Tableau Server
@@ -440,6 +1351,9 @@ class BigQueryExtractor(BaseExtractor):
             See Hyper API guide for details.
         changeset_table_name (string): The name of the table in the hyper file that contains
             the changeset (default="deleted_rowids")
+        columns (list): Columns of source_table to export (default=all columns)
+        where (string): SQL condition selecting the rows of source_table to export
+            (default=all rows)
 
         NOTES:
         - match_columns overrides match_conditions_json if both are specified
@@ -466,44 +1380,27 @@ class BigQueryExtractor(BaseExtractor):
                 None, tab_ds_name, None, match_conditions_json, None,
             )
         else:
+            actions_json = [
+                self._changeset_action_json(
+                    action="DELETE",
+                    match_columns=match_columns,
+                    match_conditions_json=match_conditions_json,
+                    changeset_table_name=changeset_table_name,
+                )
+            ]
             if sql_query:
                 # Execute query to generate update changeset - slower than bulk extract
                 output_hyper_files = self._query_to_hyper_files(
                     sql_query, changeset_table_name
                 )
-                for path_to_database in output_hyper_files:
-                    self._update_datasource_from_hyper_file(
-                        path_to_database,
-                        tab_ds_name,
-                        match_columns,
-                        match_conditions_json,
-                        changeset_table_name,
-                        action="DELETE",
-                    )
-                    os.remove(path_to_database)
             if source_table:
                 # Bulk extract and update from a changeset that is stored in a bq table
-                source_table_ref = bq_client.get_table(source_table)
-                target_table_def = self._hyper_table_definition(
-                    source_table_ref, hyper_table_name=changeset_table_name
+                output_hyper_files = self._source_table_to_hyper_files(
+                    source_table, changeset_table_name, columns, where
                 )
-                for blob in self._extract_to_blobs(source_table):
-                    temp_csv_filename = tempfile_name(prefix="temp", suffix=".csv")
-                    self._download_blob(blob, temp_csv_filename)
-                    output_hyper_files = self._csv_to_hyper_files(
-                        temp_csv_filename, target_table_def
-                    )
-                    for path_to_database in output_hyper_files:
-                        self._update_datasource_from_hyper_file(
-                            path_to_database,
-                            tab_ds_name,
-                            match_columns,
-                            match_conditions_json,
-                            changeset_table_name,
-                            action="DELETE",
-                        )
-                        os.remove(path_to_database)
-                    os.remove(Path(temp_csv_filename))
+            self._patch_datasource_from_hyper_files(
+                output_hyper_files, tab_ds_name, lambda path: actions_json
+            )
 
 
 def main():
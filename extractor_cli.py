@@ -17,6 +17,7 @@ as a template to start your own projects.
 
 -----------------------------------------------------------------------------
 """
+import atexit
 import logging
 import argparse
 import getpass
@@ -33,6 +34,7 @@ TABLEAU_DATASOURCE_NAME = "Orders"
 TABLEAU_HOSTNAME = "http://localhost"
 DEFAULT_SITE_ID = ""
 BUCKET_NAME = "emea_se"
+EXPORT_FORMAT = "CSV"
 
 
 def exclusive_args(args, *arg_names, required=True, message=None):
@@ -68,225 +70,345 @@ def required_arg(args, arg_name, message=None):
             raise argparse.ArgumentError(message)
 
 
-#
-# Initialize logging
-#
-consoleHandler = logging.StreamHandler()
-consoleHandler.setLevel(logging.INFO)
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s %(funcName)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("debug.log"), consoleHandler],
-)
-
-#
-# Parse Command Line Args
-#
-parser = argparse.ArgumentParser(
-    description="""Utilities to build Hyper Extracts from Cloud Databases
-    - load_sample: Load sample rows of data to new Tableau datasource
-    - export_load: Bulk export and load to new Tableau datasource
-    - append: Append the results of a query to an existing Tableau datasource
-    - update: Update an existing Tableau datasource with the changeset from a query
-    - delete: Delete rows from a Tableau datasource that match key columns in a changeset from a query""",
-)
-parser.add_argument(
-    "command",
-    choices=["load_sample", "export_load", "append", "update", "delete"],
-    help="Select the utility function to call",
-)
-parser.add_argument(
-    "--extractor",
-    choices=EXTRACTORS.keys(),
-    default=DEFAULT_EXTRACTOR,
-    help="Select the extractor implementation that matches your cloud database",
-)
-parser.add_argument(
-    "--source_table_id", help="Source table ID",
-)
-parser.add_argument(
-    "--tableau_project",
-    "-P",
-    default=TABLEAU_PROJECT,
-    help="Target project name (default={})".format(TABLEAU_PROJECT),
-)
-parser.add_argument(
-    "--tableau_datasource", required=True, help="Target datasource name",
-)
-parser.add_argument(
-    "--tableau_hostname",
-    "-H",
-    default=TABLEAU_HOSTNAME,
-    help="Tableau connection string (default={})".format(TABLEAU_HOSTNAME),
-)
-parser.add_argument(
-    "--tableau_site_id",
-    "-S",
-    default=DEFAULT_SITE_ID,
-    help="Tableau site id (default={})".format(DEFAULT_SITE_ID),
-)
-parser.add_argument(
-    "--bucket",
-    default=BUCKET_NAME,
-    help="Bucket used for extract staging storage (default={})".format(BUCKET_NAME),
-)
-parser.add_argument(
-    "--sample_rows",
-    default=SAMPLE_ROWS,
-    help="Defines the number of rows to use with LIMIT when command=load_sample (default={})".format(
-        SAMPLE_ROWS
-    ),
-)
-parser.add_argument(
-    "--sql",
-    help="The query string used to generate the changeset when command=[append|update|merge]",
-)
-parser.add_argument(
-    "--sqlfile",
-    help="File containing the query string used to generate the changeset when command=[append|update|delete]",
-)
-parser.add_argument(
-    "--match_columns",
-    action="append",
-    nargs=2,
-    help="Define conditions for matching source and target key columns "
-    "to use when command=[update|delete].  Specify one or more column pairs "
-    "in the format: --match_columns [source_col] [target_col]",
-)
-parser.add_argument(
-    "--match_conditions_json",
-    help="Define conditions for matching rows in json format when command=[update|delete]."
-    "See Hyper API guide for details. ",
-)
-# TODO: Add option to authenticate with api token
-parser.add_argument(
-    "--tableau_username", "-U", help="Tableau user name",
-)
-parser.add_argument(
-    "--tableau_token_name", help="Personal access token name",
-)
-parser.add_argument(
-    "--tableau_token_secretfile", help="File containing personal access token secret",
-)
-
-args = parser.parse_args()
-selected_command = args.command
-
-#
-# Initialize Extractor Implementation
-#
-TABLEAU_HOSTNAME = args.tableau_hostname
-TABLEAU_PROJECT = args.tableau_project
-TABLEAU_SITE_ID = args.tableau_site_id
-extractor_class = EXTRACTORS.get(args.extractor)
-extractor = {}
-exclusive_args(
-    args,
-    "tableau_token_name",
-    "tableau_username",
-    required=True,
-    message="Specify either tableau_token_name OR tableau_username",
-)
-if args.tableau_token_name:
-    required_arg(
-        args,
-        "tableau_token_secretfile",
-        "Must specify tableau_token_secretfile with tableau_token_name",
+def main():
+    #
+    # Initialize logging
+    #
+    consoleHandler = logging.StreamHandler()
+    consoleHandler.setLevel(logging.INFO)
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s - %(name)s %(funcName)s - %(levelname)s - %(message)s",
+        handlers=[logging.FileHandler("debug.log"), consoleHandler],
     )
-    tableau_token_secret = ""
-    with open(args.tableau_token_secretfile, "r") as myfile:
-        tableau_token_secret = myfile.read().strip()
 
-    extractor = extractor_class(
-        tableau_hostname=TABLEAU_HOSTNAME,
-        tableau_project=TABLEAU_PROJECT,
-        tableau_site_id=TABLEAU_SITE_ID,
-        staging_bucket=BUCKET_NAME,
-        tableau_token_name=args.tableau_token_name,
-        tableau_token_secret=tableau_token_secret,
+    #
+    # Parse Command Line Args
+    #
+    parser = argparse.ArgumentParser(
+        description="""Utilities to build Hyper Extracts from Cloud Databases
+        - load_sample: Load sample rows of data to new Tableau datasource
+        - export_load: Bulk export and load to new Tableau datasource
+        - backfill: Append a range of partitions of a partitioned table to an existing Tableau datasource
+        - append: Append the results of a query to an existing Tableau datasource
+        - incremental: Append the rows of a table that are past the last loaded watermark to an existing Tableau datasource
+        - update: Update an existing Tableau datasource with the changeset from a query
+        - upsert: Update existing rows and insert new rows in a Tableau datasource from the changeset from a query
+        - delete: Delete rows from a Tableau datasource that match key columns in a changeset from a query""",
     )
-else:
-    TABLEAU_USERNAME = args.tableau_username
-    TABLEAU_PASSWORD = getpass.getpass("Password: ")
-    extractor = extractor_class(
-        tableau_hostname=TABLEAU_HOSTNAME,
-        tableau_project=TABLEAU_PROJECT,
-        tableau_site_id=TABLEAU_SITE_ID,
-        staging_bucket=BUCKET_NAME,
-        tableau_username=TABLEAU_USERNAME,
-        tableau_password=TABLEAU_PASSWORD,
+    parser.add_argument(
+        "command",
+        choices=[
+            "load_sample",
+            "export_load",
+            "backfill",
+            "append",
+            "incremental",
+            "update",
+            "upsert",
+            "delete",
+        ],
+        help="Select the utility function to call",
     )
-
-#
-# Implement TABLE level commands here
-#
-if selected_command in ("load_sample", "export_load"):
-    required_arg(
-        args,
-        "source_table_id",
-        "Must specify source_table_id when command is load_sample or export_load",
+    parser.add_argument(
+        "--extractor",
+        choices=EXTRACTORS.keys(),
+        default=DEFAULT_EXTRACTOR,
+        help="Select the extractor implementation that matches your cloud database",
     )
-    if selected_command == "load_sample":
-        extractor.load_sample(
-            source_table=args.source_table_id,
-            tab_ds_name=args.tableau_datasource,
-            sample_rows=args.sample_rows,
-        )
-    if selected_command == "export_load":
-        extractor.export_load(
-            source_table=args.source_table_id, tab_ds_name=args.tableau_datasource,
-        )
+    parser.add_argument(
+        "--source_table_id", help="Source table ID",
+    )
+    parser.add_argument(
+        "--columns",
+        nargs="+",
+        help="Columns of source_table_id to export (default=all columns)",
+    )
+    parser.add_argument(
+        "--where",
+        help="SQL condition selecting the rows of source_table_id to export (default=all rows)",
+    )
+    parser.add_argument(
+        "--tableau_project",
+        "-P",
+        default=TABLEAU_PROJECT,
+        help="Target project name (default={})".format(TABLEAU_PROJECT),
+    )
+    parser.add_argument(
+        "--tableau_datasource", required=True, help="Target datasource name",
+    )
+    parser.add_argument(
+        "--tableau_hostname",
+        "-H",
+        default=TABLEAU_HOSTNAME,
+        help="Tableau connection string (default={})".format(TABLEAU_HOSTNAME),
+    )
+    parser.add_argument(
+        "--tableau_site_id",
+        "-S",
+        default=DEFAULT_SITE_ID,
+        help="Tableau site id (default={})".format(DEFAULT_SITE_ID),
+    )
+    parser.add_argument(
+        "--bucket",
+        default=BUCKET_NAME,
+        help="Bucket used for extract staging storage (default={})".format(BUCKET_NAME),
+    )
+    parser.add_argument(
+        "--staging_dataset",
+        help="BigQuery dataset (project.dataset) used to materialize large query results for bulk export "
+        "(default=anonymous query results table)",
+    )
+    parser.add_argument(
+        "--export_format",
+        choices=["CSV", "PARQUET"],
+        default=EXPORT_FORMAT,
+        help="File format used for bulk export to staging storage (default={})".format(
+            EXPORT_FORMAT
+        ),
+    )
+    parser.add_argument(
+        "--single_file",
+        action="store_true",
+        default=None,
+        help="Merge the export into one Hyper file and publish it once when command=export_load "
+        "(default=EXPORT_LOAD_SINGLE_FILE)",
+    )
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="Export and load each partition of source_table_id separately when command=export_load",
+    )
+    parser.add_argument(
+        "--start_partition",
+        help="First partition to load when command=backfill, e.g. 20200101 (default=first partition)",
+    )
+    parser.add_argument(
+        "--end_partition",
+        help="Last partition to load when command=backfill, e.g. 20201231 (default=last partition)",
+    )
+    parser.add_argument(
+        "--watermark_column",
+        help="Column that increases for new or changed rows (e.g. update timestamp) when command=incremental",
+    )
+    parser.add_argument(
+        "--initial_watermark",
+        help="Watermark to start from when none has been recorded when command=incremental (default=load all rows)",
+    )
+    parser.add_argument(
+        "--sample_rows",
+        default=SAMPLE_ROWS,
+        help="Defines the number of rows to use with LIMIT when command=load_sample (default={})".format(
+            SAMPLE_ROWS
+        ),
+    )
+    parser.add_argument(
+        "--sql",
+        help="The query string used to generate the changeset when command=[append|update|upsert|delete]",
+    )
+    parser.add_argument(
+        "--sqlfile",
+        help="File containing the query string used to generate the changeset when command=[append|update|upsert|delete]",
+    )
+    parser.add_argument(
+        "--match_columns",
+        action="append",
+        nargs=2,
+        help="Define conditions for matching source and target key columns "
+        "to use when command=[update|upsert|delete].  Specify one or more column pairs "
+        "in the format: --match_columns [source_col] [target_col]",
+    )
+    parser.add_argument(
+        "--match_conditions_json",
+        help="Define conditions for matching rows in json format when command=[update|upsert|delete]."
+        "See Hyper API guide for details. ",
+    )
+    # TODO: Add option to authenticate with api token
+    parser.add_argument(
+        "--tableau_username", "-U", help="Tableau user name",
+    )
+    parser.add_argument(
+        "--tableau_token_name", help="Personal access token name",
+    )
+    parser.add_argument(
+        "--tableau_token_secretfile", help="File containing personal access token secret",
+    )
+
+    args = parser.parse_args()
+    selected_command = args.command
 
-#
-# Implement QUERY processing commands here
-#
-if selected_command in ("append", "update", "delete"):
+    #
+    # Initialize Extractor Implementation
+    #
+    tableau_hostname = args.tableau_hostname
+    tableau_project = args.tableau_project
+    tableau_site_id = args.tableau_site_id
+    extractor_class = EXTRACTORS.get(args.extractor)
+    extractor = {}
     exclusive_args(
         args,
-        "sql",
-        "sqlfile",
-        "source_table_id",
-        required=(selected_command != "delete"),
-        message="Specify either sql OR sqlfile OR source_table_id",
+        "tableau_token_name",
+        "tableau_username",
+        required=True,
+        message="Specify either tableau_token_name OR tableau_username",
     )
-    sql_string = args.sql
-    if args.sqlfile:
-        with open(args.sqlfile, "r") as myfile:
-            sql_string = myfile.read()
+    if args.tableau_token_name:
+        required_arg(
+            args,
+            "tableau_token_secretfile",
+            "Must specify tableau_token_secretfile with tableau_token_name",
+        )
+        tableau_token_secret = ""
+        with open(args.tableau_token_secretfile, "r") as myfile:
+            tableau_token_secret = myfile.read().strip()
 
-    if selected_command == "append":
-        extractor.append_to_datasource(
-            sql_query=sql_string,
-            source_table=args.source_table_id,
-            tab_ds_name=args.tableau_datasource,
+        extractor = extractor_class(
+            tableau_hostname=tableau_hostname,
+            tableau_project=tableau_project,
+            tableau_site_id=tableau_site_id,
+            staging_bucket=args.bucket or BUCKET_NAME,
+            export_format=args.export_format,
+            staging_dataset=args.staging_dataset,
+            tableau_token_name=args.tableau_token_name,
+            tableau_token_secret=tableau_token_secret,
         )
     else:
-        #
-        #  Implement update, delete, merge commands here
-        #
-        exclusive_args(
+        tableau_username = args.tableau_username
+        tableau_password = getpass.getpass("Password: ")
+        extractor = extractor_class(
+            tableau_hostname=tableau_hostname,
+            tableau_project=tableau_project,
+            tableau_site_id=tableau_site_id,
+            staging_bucket=args.bucket or BUCKET_NAME,
+            export_format=args.export_format,
+            staging_dataset=args.staging_dataset,
+            tableau_username=tableau_username,
+            tableau_password=tableau_password,
+        )
+    atexit.register(extractor.close)
+
+    #
+    # Implement TABLE level commands here
+    #
+    if selected_command in ("load_sample", "export_load", "backfill"):
+        required_arg(
             args,
-            "match_columns",
-            "match_conditions_json",
-            required=True,
-            message="Must specify either match_columns OR match_conditions_json when command is update,delete,merge",
+            "source_table_id",
+            "Must specify source_table_id when command is load_sample, export_load or backfill",
         )
-        match_conditions_json = None
-        if args.match_conditions_json:
-            match_conditions_json = json.loads(args.match_conditions_json)
-        if selected_command == "update":
-            extractor.update_datasource(
-                sql_query=sql_string,
+        if selected_command == "load_sample":
+            extractor.load_sample(
                 source_table=args.source_table_id,
                 tab_ds_name=args.tableau_datasource,
-                match_columns=args.match_columns,
-                match_conditions_json=match_conditions_json,
+                sample_rows=args.sample_rows,
             )
-        if selected_command == "delete":
-            extractor.delete_from_datasource(
+        if selected_command == "export_load":
+            extractor.export_load(
+                source_table=args.source_table_id,
+                tab_ds_name=args.tableau_datasource,
+                single_file=args.single_file,
+                partitioned=args.partitioned,
+                columns=args.columns,
+                where=args.where,
+            )
+        if selected_command == "backfill":
+            extractor.backfill_partitions(
+                source_table=args.source_table_id,
+                tab_ds_name=args.tableau_datasource,
+                start_partition=args.start_partition,
+                end_partition=args.end_partition,
+            )
+
+    if selected_command == "incremental":
+        required_arg(
+            args,
+            "source_table_id",
+            "Must specify source_table_id when command is incremental",
+        )
+        required_arg(
+            args,
+            "watermark_column",
+            "Must specify watermark_column when command is incremental",
+        )
+        extractor.incremental_append(
+            tab_ds_name=args.tableau_datasource,
+            source_table=args.source_table_id,
+            watermark_column=args.watermark_column,
+            initial_watermark=args.initial_watermark,
+        )
+
+    #
+    # Implement QUERY processing commands here
+    #
+    if selected_command in ("append", "update", "upsert", "delete"):
+        exclusive_args(
+            args,
+            "sql",
+            "sqlfile",
+            "source_table_id",
+            required=(selected_command != "delete"),
+            message="Specify either sql OR sqlfile OR source_table_id",
+        )
+        sql_string = args.sql
+        if args.sqlfile:
+            with open(args.sqlfile, "r") as myfile:
+                sql_string = myfile.read()
+
+        if selected_command == "append":
+            extractor.append_to_datasource(
                 sql_query=sql_string,
                 source_table=args.source_table_id,
                 tab_ds_name=args.tableau_datasource,
-                match_columns=args.match_columns,
-                match_conditions_json=match_conditions_json,
+                columns=args.columns,
+                where=args.where,
+            )
+        else:
+            #
+            #  Implement update, upsert, delete commands here
+            #
+            exclusive_args(
+                args,
+                "match_columns",
+                "match_conditions_json",
+                required=True,
+                message="Must specify either match_columns OR match_conditions_json when command is update,upsert,delete",
             )
+            match_conditions_json = None
+            if args.match_conditions_json:
+                match_conditions_json = json.loads(args.match_conditions_json)
+            if selected_command == "update":
+                extractor.update_datasource(
+                    sql_query=sql_string,
+                    source_table=args.source_table_id,
+                    tab_ds_name=args.tableau_datasource,
+                    match_columns=args.match_columns,
+                    match_conditions_json=match_conditions_json,
+                    columns=args.columns,
+                    where=args.where,
+                )
+            if selected_command == "upsert":
+                extractor.upsert_to_datasource(
+                    sql_query=sql_string,
+                    source_table=args.source_table_id,
+                    tab_ds_name=args.tableau_datasource,
+                    match_columns=args.match_columns,
+                    match_conditions_json=match_conditions_json,
+                    columns=args.columns,
+                    where=args.where,
+                )
+            if selected_command == "delete":
+                extractor.delete_from_datasource(
+                    sql_query=sql_string,
+                    source_table=args.source_table_id,
+                    tab_ds_name=args.tableau_datasource,
+                    match_columns=args.match_columns,
+                    match_conditions_json=match_conditions_json,
+                    columns=args.columns,
+                    where=args.where,
+                )
+
+
+if __name__ == "__main__":
+    # Guarded so that Hyper worker processes, which are spawned and re-import the main
+    # module, do not run the command again
+    main()
@@ -26,10 +26,12 @@ import functools
 
 import json
 import requests  # Contains methods used to make HTTP requests
+from requests.adapters import HTTPAdapter
 import xml.etree.ElementTree as ET  # Contains methods used to build and parse XML
 from requests.packages.urllib3.fields import RequestField
-from requests.packages.urllib3.filepost import encode_multipart_formdata
+from requests.packages.urllib3.filepost import choose_boundary
 
+import mmap
 import os
 import uuid
 
@@ -44,8 +46,18 @@ VERSION = "3.10"
 # For when a workbook is over 64MB, break it into 5MB(standard chunk size) chunks
 CHUNK_SIZE = 1024 * 1024 * 5  # 5MB
 
+# Connection pool settings for the shared HTTP session (see requests.adapters.HTTPAdapter)
+# - HTTP_POOL_CONNECTIONS: number of hosts to keep a connection pool for
+# - HTTP_POOL_MAXSIZE: maximum number of keep-alive connections per host
+# - HTTP_POOL_BLOCK: wait for a free connection rather than exceed HTTP_POOL_MAXSIZE
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 10
+HTTP_POOL_BLOCK = True
+
 logger = logging.getLogger("hyper_samples.restapi_helpers")
 
+_default_session = None
+
 
 class ApiCallError(Exception):
     pass
@@ -81,23 +93,81 @@ def _encode_for_display(text):
     return text.encode("ascii", errors="backslashreplace").decode("utf-8")
 
 
-def _make_multipart(parts):
+class _MultipartChunk:
+    """
+    Streaming request body for one "chunk" of a multi-part upload
+    The MIME boundaries and part headers are sent around 'file_view' (a memoryview
+    of the file being uploaded) without copying the chunk into a combined post body.
+    requests sends iterables with a known length as a plain (non-chunked) body.
+
+    'file_view'     memoryview of the bytes to send in the tableau_file part
+    """
+
+    def __init__(self, file_view):
+        boundary = choose_boundary()
+        payload_part = RequestField(name="request_payload", data="", filename="")
+        payload_part.make_multipart(content_type="text/xml")
+        file_part = RequestField(name="tableau_file", data=b"", filename="file")
+        file_part.make_multipart(content_type="application/octet-stream")
+
+        self._head = "".join(
+            (
+                "--{}\r\n".format(boundary),
+                payload_part.render_headers(),
+                "\r\n",
+                "--{}\r\n".format(boundary),
+                file_part.render_headers(),
+            )
+        ).encode("utf-8")
+        self._tail = "\r\n--{}--\r\n".format(boundary).encode("utf-8")
+        self._file_view = file_view
+        self.content_type = "multipart/mixed; boundary={}".format(boundary)
+
+    def __len__(self):
+        return len(self._head) + self._file_view.nbytes + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        yield self._file_view
+        yield self._tail
+
+
+def configure_session(
+    session,
+    pool_connections=HTTP_POOL_CONNECTIONS,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    pool_block=HTTP_POOL_BLOCK,
+):
     """
-    Creates one "chunk" for a multi-part upload
-    'parts' is a dictionary that provides key-value pairs of the format name: (filename, body, content_type).
-    Returns the post body and the content type string.
-    For more information, see this post:
-        http://stackoverflow.com/questions/26299889/how-to-post-multipart-list-of-json-xml-files-using-python-requests
+    Mounts a pooled keep-alive transport on a requests.Session
+    Returns the session
+
+    'session'           requests.Session to configure (e.g. TSC.Server.session so that the
+                        connection pool is shared with tableauserverclient)
+    'pool_connections'  number of hosts to keep a connection pool for
+    'pool_maxsize'      maximum number of connections per host
+    'pool_block'        block when all connections to a host are in use
     """
-    mime_multipart_parts = []
-    for name, (filename, blob, content_type) in parts.items():
-        multipart_part = RequestField(name=name, data=blob, filename=filename)
-        multipart_part.make_multipart(content_type=content_type)
-        mime_multipart_parts.append(multipart_part)
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 
-    post_body, content_type = encode_multipart_formdata(mime_multipart_parts)
-    content_type = "".join(("multipart/mixed",) + content_type.partition(";")[1:])
-    return post_body, content_type
+def _get_session(session):
+    """
+    Returns session, or a module level pooled session if session is None
+    """
+    global _default_session
+    if session is not None:
+        return session
+    if _default_session is None:
+        _default_session = configure_session(requests.Session())
+    return _default_session
 
 
 @debug
@@ -140,23 +210,36 @@ def check_status(server_response, success_code):
 
 
 @debug
-def start_upload_session(server, auth_token, site_id):
+def start_upload_session(server, auth_token, site_id, session=None):
     """
     Creates a POST request that initiates a file upload session.
     'server'        specified server address
     'auth_token'    authentication token that grants user access to API calls
     'site_id'       ID of the site that the user is signed into
+    'session'       requests.Session to send the request with (default=shared pooled session)
     Returns a session ID that is used by subsequent functions to identify the upload session.
     """
     url = server + "/api/{0}/sites/{1}/fileUploads".format(VERSION, site_id)
-    server_response = requests.post(url, headers={"x-tableau-auth": auth_token})
+    server_response = _get_session(session).post(
+        url, headers={"x-tableau-auth": auth_token}
+    )
     check_status(server_response, 201)
     xml_response = ET.fromstring(_encode_for_display(server_response.text))
     return xml_response.find("t:fileUpload", namespaces=xmlns).get("uploadSessionId")
 
 
 @debug
-def upload_file(file_path, server, auth_token, site_id):
+def upload_file(file_path, server, auth_token, site_id, session=None):
+    """
+    Uploads a file to Tableau Server in CHUNK_SIZE chunks
+    Returns the upload session ID
+
+    'file_path'     file to upload
+    'server'        specified server address
+    'auth_token', 'site_id' from sign_in
+    'session'       requests.Session to send the requests with (default=shared pooled session)
+    """
+    session = _get_session(session)
     logger.info("Uploading {} to Tableau Server...".format(file_path))
     file = os.path.basename(file_path)
     filename, file_extension = file.split(".", 1)
@@ -167,32 +250,32 @@ def upload_file(file_path, server, auth_token, site_id):
         )
     )
     # Initiates an upload session
-    uploadID = start_upload_session(server, auth_token, site_id)
+    uploadID = start_upload_session(server, auth_token, site_id, session)
 
     # URL for PUT request to append chunks for publishing
     put_url = server + "/api/{0}/sites/{1}/fileUploads/{2}".format(
         VERSION, site_id, uploadID
     )
 
-    # Read the contents of the file in chunks of 100KB
-    with open(file_path, "rb") as f:
-        while True:
-            data = f.read(CHUNK_SIZE)
-            if not data:
-                break
-            payload, content_type = _make_multipart(
-                {
-                    "request_payload": ("", "", "text/xml"),
-                    "tableau_file": ("file", data, "application/octet-stream"),
-                }
-            )
-            logger.debug("\tPublishing a chunk...")
-            server_response = requests.put(
-                put_url,
-                data=payload,
-                headers={"x-tableau-auth": auth_token, "content-type": content_type},
-            )
-            check_status(server_response, 200)
+    # Send the file in CHUNK_SIZE slices of a read only memory map so that chunks
+    # are not copied into memory before they are written to the socket
+    if os.path.getsize(file_path) > 0:
+        with open(file_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as file_map, memoryview(file_map) as file_view:
+            for offset in range(0, file_view.nbytes, CHUNK_SIZE):
+                with file_view[offset : offset + CHUNK_SIZE] as chunk_view:
+                    payload = _MultipartChunk(chunk_view)
+                    logger.debug("\tPublishing a chunk...")
+                    server_response = session.put(
+                        put_url,
+                        data=payload,
+                        headers={
+                            "x-tableau-auth": auth_token,
+                            "content-type": payload.content_type,
+                        },
+                    )
+                    check_status(server_response, 200)
     logger.info("Upload completed.  Upload ID={}".format(uploadID))
 
     return uploadID
@@ -200,7 +283,13 @@ def upload_file(file_path, server, auth_token, site_id):
 
 @debug
 def patch_datasource(
-    server, auth_token, site_id, datasource_id, file_upload_id, request_json
+    server,
+    auth_token,
+    site_id,
+    datasource_id,
+    file_upload_id,
+    request_json,
+    session=None,
 ):
     """
     Submits a PATCH request against specified datasource
@@ -211,6 +300,7 @@ def patch_datasource(
     'datasource_id' Target Datasource on Tableau Server
     'file_upload_id' from upload_file
     'request_json' the data={} part of the PATCH call
+    'session'  requests.Session to send the request with (default=shared pooled session)
     """
 
     # Generate request id using standard UUID module
@@ -228,7 +318,7 @@ def patch_datasource(
             datasource_id, server, patch_url
         )
     )
-    server_response = requests.patch(
+    server_response = _get_session(session).patch(
         patch_url,
         data=json.dumps(request_json),
         headers={